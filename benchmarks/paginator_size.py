@@ -0,0 +1,81 @@
+"""Размер и время отрисовки пагинатора ленты при 1k, 100k и 1M постов.
+
+Сравнивает прежнюю разметку (ссылка на каждую страницу page_range)
+с окном page_window из includes/paginator.html. База не нужна:
+число постов подставляется счетчиком CountingPaginator, как это
+делает лента с counters.count_posts.
+
+    python benchmarks/paginator_size.py --posts 1000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'yatube'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+# Цикл по страницам из includes/paginator.html до page_window
+FULL_RANGE = '''
+{% for i in page_obj.paginator.page_range %}
+  {% if page_obj.number == i %}
+    <li class="page-item active">
+      <span class="page-link">{{ i }}</span>
+    </li>
+  {% else %}
+    <li class="page-item">
+      <a class="page-link" href="?{{ page_query }}page={{ i }}">{{ i }}</a>
+    </li>
+  {% endif %}
+{% endfor %}
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--posts', type=int, nargs='+', default=[1000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    return parser.parse_args()
+
+
+def measure(repeat, render):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        html = render()
+        timings.append((time.perf_counter() - started) * 1000)
+    return len(html.encode()), min(timings)
+
+
+def main():
+    args = parse_args()
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.template import Context, Template
+    from django.template.loader import get_template
+    from posts.paginators import CountingPaginator, page_window
+
+    full = Template(FULL_RANGE)
+    window = get_template('includes/paginator.html')
+    print(f'{"posts":>9} {"old size":>12} {"old ms":>8} '
+          f'{"new size":>10} {"new ms":>8}')
+    for posts in args.posts:
+        paginator = CountingPaginator(
+            range(posts), settings.FIRST_OF_POSTS, counter=lambda: posts)
+        page_obj = paginator.page(paginator.num_pages // 2)
+        page_obj.page_window = page_window(
+            page_obj, settings.PAGINATOR_ON_EACH_SIDE)
+        context = {'page_obj': page_obj, 'page_query': ''}
+        old_size, old_ms = measure(
+            args.repeat, lambda: full.render(Context(context)))
+        new_size, new_ms = measure(
+            args.repeat, lambda: window.render(context))
+        print(f'{posts:>9} {old_size:>12,} {old_ms:>8.1f} '
+              f'{new_size:>10,} {new_ms:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Задержка полнотекстового поиска (posts.search) на синтетической базе.
+
+Создает отдельную SQLite-базу со всеми миграциями, заливает посты
+(по умолчанию 1 000 000) из слов с частотами по закону Ципфа,
+чтобы были и редкие, и очень частые слова, и печатает медиану и p95
+первой страницы, дальних страниц (в пределах SEARCH_RANK_LIMIT
+и за ним) и подсчета результатов до SEARCH_COUNT_LIMIT.
+
+    python benchmarks/search_latency.py --posts 1000000 --db /tmp/search.db
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'yatube'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+WORDS = (
+    'книга дом город лето река песня дорога утро друг работа время '
+    'музыка поезд море солнце ветер письмо окно сад школа фотография '
+    'прогулка кошка собака чай кофе снег дождь вечер праздник история '
+    'программирование путешествие библиотека архитектура'
+).split()
+QUERIES = ('книга', 'фотографии прогулка', 'архитектуры', 'библиотеке чай')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='/tmp/yatube_search.sqlite3')
+    parser.add_argument('--posts', type=int, default=1_000_000)
+    parser.add_argument('--words', type=int, default=20)
+    parser.add_argument('--batch', type=int, default=50_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    return parser.parse_args()
+
+
+def setup(db):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db
+    import django
+    django.setup()
+
+
+def seed(args):
+    from django.db import connection, transaction
+    from posts.search import deferred_index
+    rnd = random.Random(0)
+    weights = [1 / rank for rank in range(1, len(WORDS) + 1)]
+    start = datetime(2020, 1, 1)
+    # INSERT в обход ORM: индекс строит deferred_index на выходе
+    with transaction.atomic(), deferred_index(), connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO auth_user (id, password, is_superuser, username, '
+            'first_name, last_name, email, is_staff, is_active, date_joined)'
+            " VALUES (1, '', 0, 'bench', '', '', '', 0, 1, %s)", [start])
+        for offset in range(0, args.posts, args.batch):
+            cursor.executemany(
+                'INSERT INTO posts_post (text, pub_date, author_id, image, '
+                'image_variants, comments_count, text_html, excerpt_html) '
+                "VALUES (%s, %s, 1, '', '', 0, '', '')",
+                [(' '.join(rnd.choices(WORDS, weights, k=args.words)),
+                  start + timedelta(seconds=i))
+                 for i in range(offset, min(offset + args.batch, args.posts))])
+
+
+def measure(repeat, run):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    # p95 по ближайшему рангу: при --repeat 5 это максимум, а не 4-й
+    return (
+        statistics.median(timings),
+        timings[math.ceil(len(timings) * 0.95) - 1])
+
+
+def main():
+    args = parse_args()
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    setup(args.db)
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    started = time.perf_counter()
+    seed(args)
+    elapsed = time.perf_counter() - started
+    print(f'Seeded {args.posts} posts in {elapsed:.1f} s')
+    from django.conf import settings
+    from posts.models import Post
+    from posts.search import SearchResults
+    per_page = settings.FIRST_OF_POSTS
+    for query in QUERIES:
+        def results():
+            # Свой объект на каждый прогон, как на каждый запрос
+            return SearchResults(query, Post.objects.for_feed())
+        print(f'\n-- {query!r}: {results().count()} posts')
+        for name, run in (
+            ('page 1', lambda: results()[0:per_page]),
+            ('page 50', lambda: results()[per_page * 49:per_page * 50]),
+            ('page 500', lambda: results()[per_page * 499:per_page * 500]),
+            ('count', lambda: results().count()),
+        ):
+            median, p95 = measure(args.repeat, run)
+            print(f'{name:>8}: median {median:.1f} ms, p95 {p95:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Время и память отрисовки шаблонов лент и страницы поста.
+
+Рисует index.html, profile.html, follow.html (10/100/1000 постов
+на странице) и post_detail.html (столько же комментариев) на
+синтетических объектах, без запросов за постами. Кеш карточек
+и фрагментов очищается перед каждой отрисовкой, так что меряется
+сам шаблон. Время — медиана, память — пик tracemalloc за отдельную
+отрисовку.
+
+По умолчанию настройки как в продакшене: DEBUG=0 и cached.Loader;
+--loader plain меряет некэшированный загрузчик. --engine jinja2
+рисует ленты портами из jinja2/ (у post_detail.html порта нет).
+--save сохраняет результат в JSON, --compare сравнивает с ним
+и завершается с кодом 1, если какой-то шаблон стал медленнее больше
+чем на --tolerance.
+
+    python benchmarks/template_render.py --save /tmp/render.json
+    python benchmarks/template_render.py --compare /tmp/render.json
+    python benchmarks/template_render.py --engine jinja2 \
+        --compare /tmp/render.json --tolerance 0
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'yatube'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+TEXT = (
+    'Сегодня гуляли по набережной, смотрели на реку и пили кофе.\n'
+    'Вечером дописал главу про <b>архитектуру</b> и лег спать.\n'
+) * 3
+
+JINJA2_PORTS = ('posts/index.html', 'posts/profile.html', 'posts/follow.html')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--loader', choices=('cached', 'plain'), default='cached')
+    parser.add_argument(
+        '--engine', choices=('django', 'jinja2'), default='django')
+    parser.add_argument('--save', help='Сохранить результат в JSON')
+    parser.add_argument('--compare', help='Сравнить с сохраненным JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    return parser.parse_args()
+
+
+def setup(loader):
+    os.environ['DEBUG'] = '0'
+    os.environ['TEMPLATE_CACHE'] = '1' if loader == 'cached' else '0'
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = ':memory:'
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def build_posts(count):
+    from posts.markup import render_text
+    from posts.models import Group, Post, User
+    group = Group(pk=1, title='Прогулки', slug='walks', description='')
+    authors = [
+        User(pk=pk, username=f'user{pk}', first_name='Имя',
+             last_name=f'Фамилия {pk}')
+        for pk in range(1, 11)]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    posts = []
+    for pk in range(1, count + 1):
+        post = Post(
+            pk=pk, text=TEXT, author=authors[pk % len(authors)],
+            group=group if pk % 2 else None,
+            pub_date=start + timedelta(minutes=pk), comments_count=pk % 7)
+        render_text(post)
+        posts.append(post)
+    return posts, authors[0]
+
+
+def build_comments(post, count):
+    from posts.models import Comment
+    start = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    return [
+        Comment(
+            pk=pk, post=post, author=post.author, text=TEXT,
+            created=start + timedelta(minutes=pk))
+        for pk in range(1, count + 1)]
+
+
+def contexts(size):
+    """(шаблон, контекст) для страниц с size постов или комментариев."""
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+    from posts.forms import CommentForm
+    from posts.models import UserStats
+    from posts.paginators import CountingPaginator, CursorPage, page_window
+    posts, author = build_posts(size)
+    paginator = CountingPaginator(posts, size, counter=lambda: size * 100)
+    page_obj = paginator.page(1)
+    page_obj.page_window = page_window(page_obj)
+    comments = CursorPage(build_comments(posts[0], size), None)
+    comments.remaining = size
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+    return request, [
+        ('posts/index.html', {'page_obj': page_obj, 'page_version': ''}),
+        ('posts/profile.html', {
+            'author': author, 'page_obj': page_obj, 'following': False,
+            'stats': UserStats(user=author, posts_count=size)}),
+        ('posts/follow.html', {'page_obj': page_obj}),
+        ('posts/post_detail.html', {
+            'post': posts[0], 'form': CommentForm(), 'comments': comments}),
+    ]
+
+
+def measure(repeat, request, name, context, engine):
+    from django.core.cache import cache
+    from django.template.loader import render_to_string
+    timings = []
+    for _ in range(repeat):
+        cache.clear()
+        started = time.perf_counter()
+        render_to_string(name, context, request, using=engine)
+        timings.append((time.perf_counter() - started) * 1000)
+    # tracemalloc замедляет отрисовку в разы, поэтому память меряется
+    # отдельным проходом
+    cache.clear()
+    tracemalloc.start()
+    render_to_string(name, context, request, using=engine)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings), peak / 1024
+
+
+def main():
+    args = parse_args()
+    setup(args.loader)
+    results = {}
+    print(f'loader: {args.loader}, engine: {args.engine}')
+    print(f'{"template":<24} {"size":>5} {"median ms":>10} {"peak KiB":>9}')
+    for size in args.sizes:
+        request, pages = contexts(size)
+        for name, context in pages:
+            if args.engine == 'jinja2' and name not in JINJA2_PORTS:
+                continue
+            ms, peak = measure(
+                args.repeat, request, name, context, args.engine)
+            results[f'{name}:{size}'] = {'ms': ms, 'peak_kib': peak}
+            print(f'{name:<24} {size:>5} {ms:>10.1f} {peak:>9.0f}')
+    if args.save:
+        with open(args.save, 'w') as stream:
+            json.dump(results, stream, indent=2)
+    if args.compare:
+        with open(args.compare) as stream:
+            baseline = json.load(stream)
+        slower = {
+            key: (baseline[key]['ms'], result['ms'])
+            for key, result in results.items()
+            if key in baseline
+            and result['ms'] > baseline[key]['ms'] * (1 + args.tolerance)}
+        for key, (before, after) in slower.items():
+            print(f'REGRESSION {key}: {before:.1f} -> {after:.1f} ms')
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
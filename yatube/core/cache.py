@@ -0,0 +1,155 @@
+"""Кеш-бэкенд для серверов с протоколом Redis поверх клиента redis-py.
+
+Соединения берутся из пула redis-py, общего для потоков процесса.
+Пакетные get_many, set_many и delete_many — один обмен с сервером
+(MGET, конвейер SET, DEL).
+Целые числа хранятся как есть, чтобы incr выполнялся на сервере
+атомарно, остальные значения — pickle, сжатый zlib, если он длиннее
+OPTIONS['COMPRESS_MIN_LENGTH'] байт. Префикс ключей и версии берутся
+из KEY_PREFIX и VERSION, как у встроенных бэкендов Django.
+"""
+import pickle
+import zlib
+
+import redis
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+COMPRESSED = b'Z'
+PICKLED = b'\x80'
+# INCRBY только для существующего ключа — одной командой на сервере,
+# чтобы между проверкой и изменением не вклинился чужой set
+INCR_SCRIPT = (
+    "if redis.call('EXISTS', KEYS[1]) == 1 then "
+    "return redis.call('INCRBY', KEYS[1], ARGV[1]) end "
+    "return nil")
+
+
+class RedisCache(BaseCache):
+    def __init__(self, server, params):
+        super().__init__(params)
+        host, _, port = server.rpartition(':')
+        options = params.get('OPTIONS', {})
+        self.client = redis.Redis(
+            host=host or 'localhost',
+            port=int(port or 6379),
+            db=int(options.get('DB', 0)),
+            password=options.get('PASSWORD'),
+            socket_timeout=options.get('SOCKET_TIMEOUT', 1),
+        )
+        self.compress_min_length = int(
+            options.get('COMPRESS_MIN_LENGTH', 1024))
+
+    def close(self, **kwargs):
+        # Django закрывает кеши после каждого запроса; соединения
+        # пула оставляем открытыми для следующих запросов.
+        pass
+
+    def encode(self, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value).encode()
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= self.compress_min_length:
+            return COMPRESSED + zlib.compress(data)
+        return data
+
+    def decode(self, data):
+        if data is None:
+            return None
+        if data[:1] == COMPRESSED:
+            return pickle.loads(zlib.decompress(data[1:]))
+        if data[:1] == PICKLED:
+            return pickle.loads(data)
+        return int(data)
+
+    def expiry(self, timeout):
+        """Срок жизни в миллисекундах: None — бессрочно, 0 — уже истек."""
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return max(int(timeout * 1000), 0)
+
+    def make_valid_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        expiry = self.expiry(timeout)
+        if expiry == 0:
+            return False
+        return bool(self.client.set(
+            self.make_valid_key(key, version), self.encode(value),
+            px=expiry, nx=True))
+
+    def get(self, key, default=None, version=None):
+        value = self.decode(
+            self.client.get(self.make_valid_key(key, version)))
+        return default if value is None else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_valid_key(key, version)
+        expiry = self.expiry(timeout)
+        if expiry == 0:
+            self.client.delete(key)
+        else:
+            self.client.set(key, self.encode(value), px=expiry)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_valid_key(key, version)
+        expiry = self.expiry(timeout)
+        if expiry == 0:
+            return bool(self.client.delete(key))
+        if expiry is None:
+            self.client.persist(key)
+            return bool(self.client.exists(key))
+        return bool(self.client.pexpire(key, expiry))
+
+    def delete(self, key, version=None):
+        self.client.delete(self.make_valid_key(key, version))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.client.mget(
+            [self.make_valid_key(key, version) for key in keys])
+        return {
+            key: self.decode(value)
+            for key, value in zip(keys, values) if value is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        # Одна посылка на сервер вместо SET на каждый ключ
+        expiry = self.expiry(timeout)
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in data.items():
+            key = self.make_valid_key(key, version)
+            if expiry == 0:
+                pipeline.delete(key)
+            else:
+                pipeline.set(key, self.encode(value), px=expiry)
+        pipeline.execute()
+        return []
+
+    def has_key(self, key, version=None):
+        return bool(self.client.exists(self.make_valid_key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_valid_key(key, version)
+        try:
+            value = self.client.eval(INCR_SCRIPT, 1, key, delta)
+        except redis.ResponseError as error:
+            raise ValueError(str(error))
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        return value
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_valid_key(key, version) for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        # Очищает всю базу DB, а не только ключи с KEY_PREFIX.
+        self.client.flushdb()
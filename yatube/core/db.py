@@ -0,0 +1,34 @@
+"""Настройка соединений с базой.
+
+Новое соединение SQLite переводится в WAL: читатели не ждут писателя,
+а synchronous=NORMAL в этом режиме не теряет целостность при сбое.
+Таймаут ожидания блокировки задается в OPTIONS['timeout'].
+
+Постоянные соединения (CONN_MAX_AGE) перед запросом проверяются:
+соединение, которое закрыл сервер или пулер, закрывается сразу,
+а не падает на первом запросе view.
+"""
+from django.db import connections
+
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+
+
+def check_connections(**kwargs):
+    for connection in connections.all():
+        if (connection.connection is None
+                or connection.vendor == 'sqlite'
+                or connection.in_atomic_block):
+            continue
+        if not connection.is_usable():
+            connection.close()
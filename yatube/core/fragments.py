@@ -0,0 +1,91 @@
+"""Фрагментный кеш, защищенный от dog-pile.
+
+Фрагмент хранится вместе с моментом, до которого он свежий, а живет
+в кеше дольше на FRAGMENT_CACHE_GRACE секунд. Когда свежесть истекла,
+фрагмент перерисовывает только запрос, взявший блокировку, остальные
+получают прежнюю копию. Если копии нет совсем, остальные ждут
+готовый фрагмент не дольше FRAGMENT_CACHE_WAIT секунд.
+
+По каждому фрагменту в том же кеше копятся метрики: hits, stale
+(отдана устаревшая копия), misses (перерисовки) и render_ms.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+LOCK_KEY = 'fragment_lock:{}'
+METRIC_KEY = 'fragment_metric:{}:{}'
+METRICS = ('hits', 'stale', 'misses', 'render_ms')
+WAIT_STEP = 0.05
+
+
+def record(name, metric, amount=1):
+    """Одно обращение к кешу, если счетчик уже есть."""
+    key = METRIC_KEY.format(name, metric)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # Счетчика нет: создаем, а если его успел создать другой
+        # запрос, прибавляем к нему.
+        if not cache.add(key, amount, None):
+            try:
+                cache.incr(key, amount)
+            except ValueError:
+                pass
+
+
+def get_metrics(name):
+    keys = {METRIC_KEY.format(name, metric): metric for metric in METRICS}
+    values = cache.get_many(list(keys))
+    return {metric: values.get(key, 0) for key, metric in keys.items()}
+
+
+def reset_metrics(name):
+    cache.delete_many([METRIC_KEY.format(name, metric) for metric in METRICS])
+
+
+def wait_for(key):
+    deadline = time.monotonic() + settings.FRAGMENT_CACHE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_render(name, vary_on, timeout, render):
+    """Возвращает фрагмент из кеша или результат render()."""
+    key = make_template_fragment_key(name, vary_on)
+    lock_key = LOCK_KEY.format(key)
+    entry = cache.get(key)
+    if entry is not None and time.time() < entry[1]:
+        record(name, 'hits')
+        return entry[0]
+    locked = cache.add(lock_key, 1, settings.FRAGMENT_CACHE_LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            record(name, 'stale')
+            return entry[0]
+        entry = wait_for(key)
+        if entry is not None:
+            record(name, 'hits')
+            return entry[0]
+    try:
+        started = time.monotonic()
+        value = render()
+        elapsed = time.monotonic() - started
+        if timeout is None:
+            cache.set(key, (value, float('inf')), None)
+        else:
+            cache.set(
+                key, (value, time.time() + timeout),
+                timeout + settings.FRAGMENT_CACHE_GRACE)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    record(name, 'misses')
+    record(name, 'render_ms', round(elapsed * 1000))
+    return value
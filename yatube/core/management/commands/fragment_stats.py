@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.fragments import get_metrics, reset_metrics
+
+
+class Command(BaseCommand):
+    help = 'Метрики фрагментного кеша {% fragment_cache %}'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='+', help='Имена фрагментов')
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить после вывода')
+
+    def handle(self, *args, **options):
+        for name in options['names']:
+            metrics = get_metrics(name)
+            average = metrics['render_ms'] / (metrics['misses'] or 1)
+            self.stdout.write(
+                f'{name}: hits={metrics["hits"]} '
+                f'stale={metrics["stale"]} misses={metrics["misses"]} '
+                f'render_avg={average:.1f}ms')
+            if options['reset']:
+                reset_metrics(name)
@@ -0,0 +1,80 @@
+"""Чтение с реплик, запись в основную базу.
+
+ReplicaMiddleware выбирает одну реплику на весь GET/HEAD-запрос;
+запросы вне HTTP (команды, воркеры) и небезопасные методы читают
+из default. Первая же запись в запросе переключает остаток запроса
+на default. Небезопасный запрос с записью, а также GET-view, вызвавший
+stick_to_primary(), ставят cookie, с которой следующие
+REPLICA_STICKY_SECONDS секунд пользователь читает из default: свои
+изменения он увидит раньше, чем до реплики дойдет репликация.
+Попутные записи при отрисовке GET (кеш миниатюр, очередь задач)
+cookie не ставят, иначе default читали бы и обычные читатели.
+"""
+import random
+import threading
+
+from django.conf import settings
+
+PRIMARY = 'default'
+STICKY_COOKIE = 'use_primary'
+# Сессии пишутся при входе и читаются сразу следующим запросом
+PRIMARY_APPS = {'sessions'}
+
+state = threading.local()
+
+
+def use_primary():
+    """Переключает остаток текущего запроса на default."""
+    state.replica = None
+
+
+def stick_to_primary():
+    """Для GET-view, которые пишут от имени пользователя (подписка)."""
+    use_primary()
+    state.sticky = True
+
+
+def reading_replica():
+    return getattr(state, 'replica', None) is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = getattr(state, 'replica', None)
+        if replica is None or model._meta.app_label in PRIMARY_APPS:
+            return PRIMARY
+        return replica
+
+    def db_for_write(self, model, **hints):
+        state.replica = None
+        state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и default.
+        return True
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas = settings.REPLICA_DATABASES
+        state.wrote = False
+        state.sticky = False
+        state.replica = (
+            random.choice(replicas)
+            if replicas and request.method in ('GET', 'HEAD')
+            and STICKY_COOKIE not in request.COOKIES
+            else None)
+        try:
+            response = self.get_response(request)
+        finally:
+            state.replica = None
+        safe = request.method in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+        if replicas and (state.sticky or state.wrote and not safe):
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
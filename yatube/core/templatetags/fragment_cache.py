@@ -0,0 +1,45 @@
+from django import template
+
+from core.fragments import get_or_render
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, expire_time, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.expire_time = expire_time
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        expire_time = self.expire_time.resolve(context)
+        if expire_time is not None:
+            try:
+                expire_time = int(expire_time)
+            except (ValueError, TypeError):
+                raise template.TemplateSyntaxError(
+                    f'"fragment_cache" получил нечисловой срок: '
+                    f'{expire_time!r}')
+        return get_or_render(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on],
+            expire_time,
+            lambda: self.nodelist.render(context))
+
+
+@register.tag
+def fragment_cache(parser, token):
+    """Замена {% cache %}, не пускающая параллельные перерисовки.
+
+    {% fragment_cache 20 sidebar page_obj.number %}...{% endfragment_cache %}
+    """
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} ожидает срок и имя фрагмента')
+    return FragmentCacheNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]])
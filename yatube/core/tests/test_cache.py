@@ -0,0 +1,272 @@
+import socket
+import socketserver
+import threading
+import time
+from unittest import mock
+
+from redis.connection import Connection
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..cache import COMPRESSED, INCR_SCRIPT, RedisCache
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Небольшое подмножество команд Redis поверх общего словаря."""
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = [
+                self.rfile.read(int(self.rfile.readline()[1:]) + 2)[:-2]
+                for _ in range(int(line[1:]))]
+            command = args[0].decode().lower()
+            command = {'del': 'delete'}.get(command, command)
+            with self.server.lock:
+                self.wfile.write(getattr(self, command)(*args[1:]))
+
+    def setup(self):
+        super().setup()
+        self.server.clients.add(self.connection)
+
+    def finish(self):
+        self.server.clients.discard(self.connection)
+        super().finish()
+
+    @property
+    def data(self):
+        now = time.monotonic()
+        for key, (value, expires) in list(self.server.data.items()):
+            if expires is not None and expires <= now:
+                del self.server.data[key]
+        return self.server.data
+
+    @staticmethod
+    def bulk(value):
+        if value is None:
+            return b'$-1\r\n'
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def ping(self):
+        return b'+PONG\r\n'
+
+    def select(self, db):
+        return b'+OK\r\n'
+
+    def get(self, key):
+        return self.bulk(self.data.get(key, (None,))[0])
+
+    def mget(self, *keys):
+        data = self.data
+        return b'*%d\r\n' % len(keys) + b''.join(
+            self.bulk(data.get(key, (None,))[0]) for key in keys)
+
+    def set(self, key, value, *options):
+        options = [option.upper() for option in options]
+        expires = None
+        if b'PX' in options:
+            milliseconds = int(options[options.index(b'PX') + 1])
+            expires = time.monotonic() + milliseconds / 1000
+        if b'NX' in options and key in self.data:
+            return self.bulk(None)
+        self.server.data[key] = (value, expires)
+        return b'+OK\r\n'
+
+    def delete(self, *keys):
+        return b':%d\r\n' % sum(
+            self.data.pop(key, None) is not None for key in keys)
+
+    def exists(self, key):
+        return b':%d\r\n' % (key in self.data)
+
+    def incrby(self, key, delta):
+        value, expires = self.data.get(key, (b'0', None))
+        try:
+            value = int(value) + int(delta)
+        except ValueError:
+            return b'-ERR value is not an integer or out of range\r\n'
+        self.server.data[key] = (str(value).encode(), expires)
+        return b':%d\r\n' % value
+
+    def eval(self, script, numkeys, key, delta):
+        # Единственный скрипт бэкенда: INCRBY существующего ключа
+        assert script.decode() == INCR_SCRIPT
+        if key not in self.data:
+            return self.bulk(None)
+        return self.incrby(key, delta)
+
+    def pexpire(self, key, milliseconds):
+        if key not in self.data:
+            return b':0\r\n'
+        self.server.data[key] = (
+            self.data[key][0], time.monotonic() + int(milliseconds) / 1000)
+        return b':1\r\n'
+
+    def persist(self, key):
+        if key not in self.data:
+            return b':0\r\n'
+        self.server.data[key] = (self.data[key][0], None)
+        return b':1\r\n'
+
+    def flushdb(self):
+        self.server.data.clear()
+        return b'+OK\r\n'
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRedisHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+        self.clients = set()
+
+    def drop_clients(self):
+        for connection in list(self.clients):
+            connection.shutdown(socket.SHUT_RDWR)
+        self.clients.clear()
+
+    @property
+    def location(self):
+        return '%s:%d' % self.server_address
+
+
+class RedisCacheTestMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeRedisServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def make_cache(self, **params):
+        return RedisCache(self.server.location, params)
+
+
+class RedisCacheTest(RedisCacheTestMixin, TestCase):
+    def setUp(self):
+        self.server.data.clear()
+        self.cache = self.make_cache(
+            KEY_PREFIX='yatube', OPTIONS={'COMPRESS_MIN_LENGTH': 100})
+
+    def test_round_trip(self):
+        values = (1, -5, 'текст', b'bytes', [1, 2], {'a': None}, True, 1.5)
+        for value in values:
+            with self.subTest(value=value):
+                self.cache.set('key', value)
+                self.assertEqual(self.cache.get('key'), value)
+                self.assertIs(type(self.cache.get('key')), type(value))
+        self.assertIsNone(self.cache.get('missing'))
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+
+    def test_prefix_and_version(self):
+        """Ключи с разными префиксами и версиями не пересекаются."""
+        other = self.make_cache(KEY_PREFIX='other', VERSION=2)
+        self.cache.set('key', 'yatube')
+        other.set('key', 'other')
+        self.assertEqual(self.cache.get('key'), 'yatube')
+        self.assertEqual(other.get('key'), 'other')
+        self.assertIsNone(self.cache.get('key', version=2))
+        self.assertEqual(
+            set(self.server.data), {b'yatube:1:key', b'other:2:key'})
+
+    def test_large_values_are_compressed(self):
+        fragment = '<article>пост</article>' * 100
+        self.cache.set('small', 'пост')
+        self.cache.set('large', fragment)
+        self.assertNotEqual(
+            self.server.data[b'yatube:1:small'][0][:1], COMPRESSED)
+        stored = self.server.data[b'yatube:1:large'][0]
+        self.assertEqual(stored[:1], COMPRESSED)
+        self.assertLess(len(stored), len(fragment.encode()))
+        self.assertEqual(self.cache.get('large'), fragment)
+
+    def test_add_and_incr(self):
+        self.assertTrue(self.cache.add('counter', 10))
+        self.assertFalse(self.cache.add('counter', 20))
+        self.assertEqual(self.cache.incr('counter', 5), 15)
+        self.assertEqual(self.cache.decr('counter'), 14)
+        self.cache.set('zero', 0)
+        self.assertEqual(self.cache.incr('zero'), 1)
+        self.assertEqual(self.cache.get('zero'), 1)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.assertFalse(self.cache.has_key('missing'))
+        self.cache.set('text', 'не число')
+        with self.assertRaises(ValueError):
+            self.cache.incr('text')
+
+    def test_many_and_delete(self):
+        self.cache.set_many({'a': 1, 'b': 'два'})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'два'})
+        self.cache.delete('a')
+        self.assertFalse(self.cache.has_key('a'))
+        self.cache.delete_many(['b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_many_in_one_round_trip(self):
+        data = {f'key{i}': i for i in range(20)}
+        send = Connection.send_packed_command
+        with mock.patch.object(
+                Connection, 'send_packed_command', autospec=True,
+                side_effect=send) as sent:
+            self.cache.set_many(data, 0.05)
+            self.assertEqual(self.cache.get_many(data), data)
+            self.cache.delete_many(['key0', 'key1'])
+        self.assertEqual(sent.call_count, 3)
+        time.sleep(0.1)
+        self.assertEqual(self.cache.get_many(data), {})
+
+    def test_timeouts(self):
+        self.cache.set('short', 1, 0.05)
+        self.cache.set('forever', 1, None)
+        self.cache.set('expired', 1, 0)
+        self.assertFalse(self.cache.has_key('expired'))
+        self.assertTrue(self.cache.touch('forever', 0.05))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertIsNone(self.cache.get('forever'))
+
+    def test_clear(self):
+        self.cache.set('key', 1)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_reconnects_after_server_drop(self):
+        self.cache.set('key', 1)
+        self.server.drop_clients()
+        self.assertEqual(self.cache.get('key'), 1)
+
+
+class SharedCacheViewsTest(RedisCacheTestMixin, TestCase):
+    """Счетчики и кеш страниц работают поверх общего сервера."""
+    def test_page_cache_through_server(self):
+        user = User.objects.create_user(username='leo')
+        Post.objects.create(text='Пост', author=user)
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'core.cache.RedisCache',
+            'LOCATION': self.server.location,
+            'KEY_PREFIX': 'yatube',
+        }}):
+            cache.clear()
+            client = Client()
+            client.get(reverse('posts:index'))
+            with self.assertNumQueries(0):
+                client.get(reverse('posts:index'))
+            Post.objects.create(text='Свежий пост', author=user)
+            self.assertContains(client.get(reverse('posts:index')), 'Свежий')
+        self.assertTrue(any(
+            key.startswith(b'yatube:1:page:') for key in self.server.data))
@@ -0,0 +1,40 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase
+
+from ..db import check_connections
+
+
+class SQLiteConnectionTest(SimpleTestCase):
+    def test_new_connection_uses_wal(self):
+        path = tempfile.NamedTemporaryFile(
+            suffix='.sqlite3', delete=False).name
+        self.addCleanup(os.remove, path)
+        wrapper = DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': path}, alias='wal')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            # 1 — NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class HealthCheckTest(SimpleTestCase):
+    def test_broken_connection_is_closed(self):
+        broken = mock.Mock(
+            vendor='postgresql', in_atomic_block=False,
+            **{'is_usable.return_value': False})
+        healthy = mock.Mock(
+            vendor='postgresql', in_atomic_block=False,
+            **{'is_usable.return_value': True})
+        with mock.patch('core.db.connections') as connections:
+            connections.all.return_value = [broken, healthy]
+            check_connections()
+        broken.close.assert_called_once()
+        healthy.close.assert_not_called()
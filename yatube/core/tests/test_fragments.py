@@ -0,0 +1,90 @@
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
+from django.template import Context, Template, TemplateSyntaxError
+from django.test import TestCase, override_settings
+
+from ..fragments import LOCK_KEY, get_metrics, get_or_render
+
+NAME = 'sidebar'
+
+
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.key = make_template_fragment_key(NAME, [1])
+        self.render = mock.Mock(return_value='свежий')
+
+    def expire(self):
+        """Делает фрагмент устаревшим, но оставляет его в кеше."""
+        value, _ = cache.get(self.key)
+        cache.set(self.key, (value, time.time() - 1))
+
+    def test_hit_and_miss(self):
+        for _ in range(3):
+            self.assertEqual(
+                get_or_render(NAME, [1], 20, self.render), 'свежий')
+        self.render.assert_called_once()
+        metrics = get_metrics(NAME)
+        self.assertEqual(metrics['hits'], 2)
+        self.assertEqual(metrics['misses'], 1)
+        self.assertEqual(metrics['stale'], 0)
+
+    def test_hit_costs_one_metric_call(self):
+        """Попадание — get фрагмента и один incr метрики."""
+        get_or_render(NAME, [1], 20, self.render)
+        get_or_render(NAME, [1], 20, self.render)
+        with mock.patch('core.fragments.cache', wraps=cache) as spy:
+            get_or_render(NAME, [1], 20, self.render)
+        self.assertEqual(
+            [call[0] for call in spy.method_calls], ['get', 'incr'])
+        self.assertEqual(get_metrics(NAME)['hits'], 2)
+
+    def test_stale_served_while_other_renders(self):
+        """Пока блокировка занята, устаревший фрагмент отдается как есть."""
+        get_or_render(NAME, [1], 20, lambda: 'старый')
+        self.expire()
+        cache.add(LOCK_KEY.format(self.key), 1)
+        self.assertEqual(get_or_render(NAME, [1], 20, self.render), 'старый')
+        self.render.assert_not_called()
+        self.assertEqual(get_metrics(NAME)['stale'], 1)
+
+    def test_stale_recomputed_by_lock_holder(self):
+        get_or_render(NAME, [1], 20, lambda: 'старый')
+        self.expire()
+        self.assertEqual(get_or_render(NAME, [1], 20, self.render), 'свежий')
+        self.assertIsNone(cache.get(LOCK_KEY.format(self.key)))
+        self.assertEqual(get_metrics(NAME)['misses'], 2)
+
+    @override_settings(FRAGMENT_CACHE_WAIT=0)
+    def test_cold_miss_renders_without_value(self):
+        """Без копии в кеше ждать нечего: фрагмент рисуется сразу."""
+        cache.add(LOCK_KEY.format(self.key), 1)
+        self.assertEqual(get_or_render(NAME, [1], 20, self.render), 'свежий')
+
+    def test_template_tag(self):
+        template = Template(
+            '{% load fragment_cache %}'
+            '{% fragment_cache 20 sidebar page %}{{ text }}'
+            '{% endfragment_cache %}')
+        self.assertEqual(
+            template.render(Context({'page': 1, 'text': 'один'})), 'один')
+        self.assertEqual(
+            template.render(Context({'page': 1, 'text': 'два'})), 'один')
+        self.assertEqual(
+            template.render(Context({'page': 2, 'text': 'два'})), 'два')
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% load fragment_cache %}'
+                     '{% fragment_cache 20 %}{% endfragment_cache %}')
+
+    def test_stats_command(self):
+        get_or_render(NAME, [1], 20, self.render)
+        get_or_render(NAME, [1], 20, self.render)
+        out = StringIO()
+        call_command('fragment_stats', NAME, '--reset', stdout=out)
+        self.assertIn('hits=1 stale=0 misses=1', out.getvalue())
+        self.assertEqual(get_metrics(NAME)['hits'], 0)
@@ -0,0 +1,130 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User, UserStats
+
+from ..replicas import STICKY_COOKIE
+
+REPLICA = 'replica'
+INDEX_URL = reverse('posts:index')
+
+
+@override_settings(REPLICA_DATABASES=[REPLICA])
+class ReplicaRoutingTest(TransactionTestCase):
+    """default — тестовая база, реплика — отдельный файл SQLite.
+
+    Репликации между ними нет, поэтому по содержимому страницы видно,
+    из какой базы она прочитана.
+    """
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_file = tempfile.NamedTemporaryFile(
+            suffix='.sqlite3', delete=False).name
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': cls.replica_file,
+        }
+        call_command('migrate', database=REPLICA, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        os.remove(cls.replica_file)
+
+    def setUp(self):
+        cache.clear()
+        self.user = self.replicate(User(username='leo'))
+        self.replicate(UserStats.objects.get(user=self.user))
+
+    def replicate(self, instance):
+        """Сохраняет объект в обе базы, как это сделала бы репликация."""
+        instance.save(using='default')
+        instance.save(using=REPLICA)
+        return instance
+
+    def test_anonymous_reads_from_replica(self):
+        Post.objects.create(text='Только в default', author=self.user)
+        self.replicate(Post(text='Уже на реплике', author=self.user))
+        response = Client().get(INDEX_URL)
+        self.assertContains(response, 'Уже на реплике')
+        self.assertNotContains(response, 'Только в default')
+
+    def test_writer_sticks_to_primary(self):
+        """После записи автор видит ее, даже пока реплика отстает."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        profile_url = reverse('posts:profile', args=[self.user.username])
+        self.assertContains(client.get(profile_url), 'Новый пост')
+        del client.cookies[STICKY_COOKIE]
+        self.assertNotContains(client.get(profile_url), 'Новый пост')
+
+    def test_read_only_request_sets_no_cookie(self):
+        response = Client().get(INDEX_URL)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_incidental_write_sets_no_cookie(self):
+        """Запись при отрисовке GET не прикрепляет читателя к default."""
+        for using in ('default', REPLICA):
+            UserStats.objects.using(using).filter(user=self.user).delete()
+        response = Client().get(
+            reverse('posts:profile', args=[self.user.username]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(UserStats.objects.using('default').filter(
+            user=self.user).exists())
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_follow_sticks_to_primary(self):
+        author = self.replicate(User(username='tolstoy'))
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse('posts:profile_follow', args=[author.username]))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_writes_go_to_primary(self):
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('posts:post_create'), {'text': 'Новый пост'})
+        self.assertTrue(Post.objects.using('default').exists())
+        self.assertFalse(Post.objects.using(REPLICA).exists())
+
+    def test_fresh_change_not_cached_from_replica(self):
+        """Пока реплика может отставать, ее страница не кешируется."""
+        self.replicate(Post(text='Уже на реплике', author=self.user))
+        Post.objects.create(text='Только в default', author=self.user)
+        response = Client().get(INDEX_URL)
+        self.assertNotContains(response, 'Только в default')
+        self.assertFalse(response.has_header('ETag'))
+        later = time.time_ns() + 10 ** 10
+        with mock.patch('time.time_ns', return_value=later):
+            response = Client().get(INDEX_URL)
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_stale_page_refilled_from_primary(self):
+        """Устаревшую копию сразу после записи перерисовывает default."""
+        self.replicate(Post(text='Уже на реплике', author=self.user))
+        later = time.time_ns() + 10 ** 10
+        with mock.patch('time.time_ns', return_value=later):
+            Client().get(INDEX_URL)
+        Post.objects.create(text='Только в default', author=self.user)
+        self.assertContains(Client().get(INDEX_URL), 'Только в default')
+        with self.assertNumQueries(0, using=REPLICA):
+            self.assertContains(
+                Client().get(INDEX_URL), 'Только в default')
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Post, Group, Follow, Comment
+from .search import filter_matching
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -10,6 +11,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Полнотекстовый индекс вместо LIKE '%...%' по всей таблице.
+        if not search_term:
+            return queryset, False
+        return filter_matching(queryset, search_term), False
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'post', 'created',)
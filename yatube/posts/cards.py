@@ -0,0 +1,68 @@
+"""Кеш карточек постов posts/includes/post_info.html для лент.
+
+Ключ карточки содержит версии ее зависимостей: самого поста
+(правка, комментарии, готовая миниатюра), строки автора и строки
+группы. Правка поста меняет ключ только его карточки. Страница ленты
+достает карточки одним get_many и рисует лишь отсутствующие, так что
+перерисовка внешнего фрагмента sidebar почти ничего не стоит.
+Попадания и промахи копятся в метриках фрагмента post_card.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from core.fragments import record
+
+from .page_cache import VERSION_KEY, dependency, get_versions
+
+CARD_KEY = 'post_card:{}:{}:{}'
+CARD_TEMPLATE = 'posts/includes/post_info.html'
+METRICS_NAME = 'post_card'
+
+
+def card_dependencies(post):
+    dependencies = [
+        dependency('post', post.pk), dependency('user_row', post.author_id)]
+    if post.group_id is not None:
+        dependencies.append(dependency('group_row', post.group_id))
+    return dependencies
+
+
+def render_cards(posts, group=None, using=None):
+    """HTML карточек posts по порядку.
+
+    group — группа страницы: на ее странице ссылка на группу
+    в карточке не выводится, поэтому это отдельный вариант карточки.
+    using — движок шаблонов, у каждого движка свои карточки.
+    """
+    posts = list(posts)
+    if not posts:
+        return []
+    variant = f'{using or "django"}-{int(group is None)}'
+    versions = get_versions({
+        item for post in posts for item in card_dependencies(post)})
+    keys = [
+        CARD_KEY.format(post.pk, variant, '-'.join(
+            str(versions[VERSION_KEY.format(item)])
+            for item in card_dependencies(post)))
+        for post in posts]
+    cards = cache.get_many(keys)
+    missing = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards]
+    if missing:
+        template = get_template(CARD_TEMPLATE, using=using)
+        started = time.monotonic()
+        rendered = {
+            key: template.render({'post': post, 'group': group})
+            for key, post in missing}
+        elapsed = time.monotonic() - started
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+        record(METRICS_NAME, 'misses', len(missing))
+        record(METRICS_NAME, 'render_ms', round(elapsed * 1000))
+    if len(missing) < len(posts):
+        record(METRICS_NAME, 'hits', len(posts) - len(missing))
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Post
+
+TOTAL_KEY = 'post_count:all'
+COUNT_KEY = 'post_count:{field}:{value}'
+
+
+def counter_key(field, value):
+    return COUNT_KEY.format(field=field, value=value)
+
+
+def count_posts(field=None, values=()):
+    """Число постов всего или у набора групп/авторов.
+
+    Счетчики лежат в кеше и поддерживаются сигналами Post,
+    к таблице постов обращаемся только за отсутствующими ключами.
+    """
+    if field is None:
+        count = cache.get(TOTAL_KEY)
+        if count is None:
+            count = Post.objects.count()
+            cache.set(TOTAL_KEY, count, settings.POST_COUNT_CACHE_TIMEOUT)
+        return count
+    keys = {counter_key(field, value): value for value in values}
+    counts = cache.get_many(keys)
+    missing = [value for key, value in keys.items() if key not in counts]
+    if missing:
+        fresh = dict.fromkeys(missing, 0)
+        fresh.update(
+            Post.objects.filter(**{f'{field}__in': missing})
+            .order_by().values_list(field).annotate(Count('pk')))
+        fresh = {
+            counter_key(field, value): count
+            for value, count in fresh.items()}
+        cache.set_many(fresh, settings.POST_COUNT_CACHE_TIMEOUT)
+        counts.update(fresh)
+    return sum(counts.values())
+
+
+def change_counters(post, delta, group_id=None):
+    keys = [TOTAL_KEY, counter_key('author_id', post.author_id)]
+    if group_id is not None:
+        keys.append(counter_key('group_id', group_id))
+    for key in keys:
+        shift_counter(key, delta)
+
+
+def shift_counter(key, delta):
+    # Только после фиксации: откаченный пост не должен сдвигать счетчик.
+    transaction.on_commit(lambda: incr_counter(key, delta))
+
+
+def incr_counter(key, delta):
+    # Отсутствующий счетчик не создаем: его посчитает первое чтение.
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        pass
+
+
+def reset_counters():
+    cache.delete(TOTAL_KEY)
+    cache.delete_many(
+        [counter_key('author_id', pk) for pk in
+         Post.objects.order_by().values_list('author_id', flat=True)
+         .distinct()]
+        + [counter_key('group_id', pk) for pk in
+           Post.objects.order_by().exclude(group=None)
+           .values_list('group_id', flat=True).distinct()])
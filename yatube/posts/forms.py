@@ -1,13 +1,38 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from django.utils.datastructures import MultiValueDict
 
+from .images import check_upload, downscale_upload
 from .models import Post, Comment
 
+IMAGE_TOO_LARGE = 'Картинка слишком большая для обработки'
+IMAGE_NOT_PROCESSED = (
+    'Не удалось обработать картинку, сохраните ее в JPEG или PNG')
+
 
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        # ImageField уже прочитал заголовок и выполнил verify(),
+        # пиксели до этого места не декодируются.
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        if not check_upload(image):
+            raise forms.ValidationError(IMAGE_TOO_LARGE, code='too_large')
+        try:
+            result = downscale_upload(image)
+        except (OSError, ValueError, KeyError):
+            raise forms.ValidationError(
+                IMAGE_NOT_PROCESSED, code='not_processed')
+        if result is not image and isinstance(self.files, MultiValueDict):
+            # Запрос закрывает свои файлы по завершении, теперь и этот
+            self.files.appendlist(self.add_prefix('image'), result)
+        return result
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
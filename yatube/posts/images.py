@@ -0,0 +1,199 @@
+"""Адаптивные варианты картинок постов для srcset.
+
+При загрузке картинки строится набор ширин POST_IMAGE_WIDTHS в каждом
+формате из POST_IMAGE_FORMATS, который умеет сохранять Pillow
+(WebP только при сборке Pillow с libwebp, JPEG всегда). Имя варианта
+содержит полное имя оригинала в хранилище, поэтому картинки
+с одинаковым именем файла в разных каталогах не делят варианты.
+Варианты удаляются вместе с заменой или удалением картинки поста.
+"""
+import json
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+}
+# Image.MIME заполняется только после Image.init(), а его на пути
+# рендера ленты никто не вызывает.
+MIME_TYPES = {
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+VARIANT_NAME = 'posts/variants/{name}-{width}.{extension}'
+
+
+def available_formats():
+    Image.init()
+    return [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if image_format in Image.SAVE]
+
+
+def variant_name(image_name, width, image_format):
+    return VARIANT_NAME.format(
+        name=image_name, width=width, extension=EXTENSIONS[image_format])
+
+
+def variant_names(image_name, variants):
+    """Имена файлов вариантов по JSON из Post.image_variants."""
+    if not image_name or not variants:
+        return []
+    return [
+        variant_name(image_name, width, image_format)
+        for image_format, widths in json.loads(variants).items()
+        for width in widths]
+
+
+def delete_variants(storage, names):
+    """Удаляет файлы вариантов после фиксации транзакции."""
+    def delete():
+        for name in names:
+            storage.delete(name)
+    if names:
+        transaction.on_commit(delete)
+
+
+def save_variant(storage, name, image, image_format):
+    buffer = BytesIO()
+    image.save(
+        buffer, image_format,
+        quality=settings.POST_IMAGE_QUALITY, optimize=True)
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_variants(image_file):
+    """Сохраняет варианты картинки, возвращает (ширина, высота, варианты)."""
+    with image_file.open('rb'), Image.open(image_file) as original:
+        original = original.convert('RGB')
+    width, height = original.size
+    widths = sorted({min(size, width) for size in settings.POST_IMAGE_WIDTHS})
+    variants = {image_format: widths for image_format in available_formats()}
+    for size in widths:
+        resized = original.resize(
+            (size, max(1, round(height * size / width))), Image.LANCZOS)
+        for image_format in variants:
+            save_variant(
+                image_file.storage,
+                variant_name(image_file.name, size, image_format),
+                resized, image_format)
+    return width, height, json.dumps(variants)
+
+
+def update_variants(post):
+    from .models import Post
+    fields = {'image_width': None, 'image_height': None, 'image_variants': ''}
+    if post.image:
+        try:
+            (fields['image_width'], fields['image_height'],
+             fields['image_variants']) = build_variants(post.image)
+        except (OSError, ValueError):
+            logger.exception('Image variants for %s failed', post.image.name)
+    Post.objects.filter(pk=post.pk).update(**fields)
+    for field, value in fields.items():
+        setattr(post, field, value)
+
+
+def image_sources(post):
+    """Источники <picture>: MIME-тип, srcset и запасной src по форматам."""
+    if not post.image_variants:
+        return []
+    sources = []
+    for image_format, widths in json.loads(post.image_variants).items():
+        urls = [
+            (post.image.storage.url(
+                variant_name(post.image.name, width, image_format)), width)
+            for width in widths]
+        sources.append({
+            'type': MIME_TYPES[image_format],
+            'srcset': ', '.join(f'{url} {width}w' for url, width in urls),
+            'src': urls[-1][0],
+        })
+    return sources
+
+
+def decode_budget(image):
+    """Байты, которые займет декодированная картинка с учетом draft."""
+    image.draft('RGB', (settings.POST_IMAGE_MAX_SIDE,) * 2)
+    width, height = image.size
+    return width * height * len(image.getbands())
+
+
+def check_upload(upload):
+    """Проверяет заголовок картинки до декодирования пикселей.
+
+    Image.open читает только заголовок, draft для JPEG уменьшает
+    масштаб декодирования, поэтому оценка памяти ничего не распаковывает.
+    """
+    try:
+        with Image.open(upload) as image:
+            return decode_budget(image) <= settings.POST_IMAGE_MAX_MEMORY
+    except Image.DecompressionBombError:
+        return False
+    except OSError:
+        # Не картинка: сообщение об ошибке выдаст сам ImageField.
+        return True
+    finally:
+        upload.seek(0)
+
+
+def save_format(image, image_format):
+    """Формат для пересохранения: Pillow читает больше форматов, чем пишет.
+
+    Незаписываемый формат (PSD и т.п.) заменяется PNG для картинок
+    с прозрачностью и JPEG для остальных.
+    """
+    Image.init()
+    if image_format in Image.SAVE:
+        return image, image_format
+    if 'A' in image.getbands() or 'transparency' in image.info:
+        return image.convert('RGBA'), 'PNG'
+    return image.convert('RGB'), 'JPEG'
+
+
+def downscale_upload(upload):
+    """Уменьшает слишком большой оригинал и удаляет из него EXIF.
+
+    Результат пишется во временный файл на диске и сохраняется
+    в хранилище по частям, а не целиком из памяти; замененный
+    оригинал закрывается.
+    """
+    with Image.open(upload) as image:
+        image_format = 'JPEG' if image.format == 'MPO' else image.format
+        if (max(image.size) <= settings.POST_IMAGE_MAX_SIDE
+                and 'exif' not in image.info):
+            upload.seek(0)
+            return upload
+        decode_budget(image)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(
+            (settings.POST_IMAGE_MAX_SIDE,) * 2, reducing_gap=2.0)
+        name, content_type = upload.name, upload.content_type
+        image, save_as = save_format(image, image_format)
+        if save_as != image_format:
+            name = f'{os.path.splitext(name)[0]}.{save_as.lower()}'
+            content_type = Image.MIME[save_as]
+        # PNG и WebP пишут EXIF из info, как и JPEG
+        image.info.pop('exif', None)
+        result = TemporaryUploadedFile(name, content_type, 0, None)
+        try:
+            image.save(result, save_as, quality=settings.POST_IMAGE_QUALITY)
+        except Exception:
+            result.close()
+            raise
+    upload.close()
+    result.size = result.tell()
+    result.seek(0)
+    return result
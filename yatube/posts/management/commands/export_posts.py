@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import WRITERS, export_records
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии и подписки в JSONL или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки, по умолчанию stdout')
+        parser.add_argument(
+            '--format', choices=sorted(WRITERS), default=None,
+            help='По умолчанию по расширению файла, иначе jsonl')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        records = export_records(options['chunk_size'])
+        if path == '-':
+            WRITERS[fmt](sys.stdout, records)
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            WRITERS[fmt](stream, records)
+        self.stderr.write(self.style.SUCCESS(f'Выгружено в {path}'))
+
+
+def guess_format(path):
+    return 'csv' if path.endswith('.csv') else 'jsonl'
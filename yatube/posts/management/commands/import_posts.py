@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from posts.transfer import READERS, Importer
+
+from .export_posts import guess_format
+
+
+class Command(BaseCommand):
+    help = 'Загружает группы, посты, комментарии и подписки из JSONL или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для загрузки, по умолчанию stdin')
+        parser.add_argument(
+            '--format', choices=sorted(READERS), default=None,
+            help='По умолчанию по расширению файла, иначе jsonl')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Записей одного типа в пачке bulk_create')
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--rebuild-timeline', action='store_true',
+            help='Заново разложить все ленты подписок вместо раскладки '
+                 'только загруженных постов и подписок')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        read = READERS[options['format'] or guess_format(path)]
+        importer = Importer(
+            options['batch_size'], options['database'],
+            options['rebuild_timeline'])
+        try:
+            if path == '-':
+                counts = importer.load(read(sys.stdin))
+            else:
+                with open(path, encoding='utf-8', newline='') as stream:
+                    counts = importer.load(read(stream))
+        except (ValueError, KeyError, DatabaseError) as error:
+            raise CommandError(f'Загрузка прервана: {error!r}')
+        self.stdout.write(self.style.SUCCESS(', '.join(
+            f'{kind}: {count}' for kind, count in counts.items())))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import process_jobs
+
+
+class Command(BaseCommand):
+    help = 'Воркер очереди миниатюр ThumbnailJob'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь один раз и выйти')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Пауза при пустой очереди, секунды')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_jobs(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Миниатюр сгенерировано: {processed}')
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['sleep'])
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import UserStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику всех пользователей с нуля'
+
+    def handle(self, *args, **options):
+        stats = UserStats.objects.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано пользователей: {len(stats)}'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счетчики комментариев постов с самими комментариями'
+
+    def handle(self, *args, **options):
+        fixed = Post.objects.reconcile_comments()
+        self.stdout.write(
+            self.style.SUCCESS(f'Исправлено постов: {fixed}'))
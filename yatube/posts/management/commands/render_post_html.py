@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.markup import render_text
+from posts.models import Post
+from posts.page_cache import bump_feeds, dependency
+
+
+class Command(BaseCommand):
+    help = 'Заполняет text_html и excerpt_html постов пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать все посты, а не только незаполненные')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.order_by('pk').only('text')
+        if not options['all']:
+            posts = posts.filter(text_html='')
+        batch_size = options['batch_size']
+        last_pk = 0
+        total = 0
+        while True:
+            # Keyset по pk: заполненные строки выпадают из выборки,
+            # и OFFSET пропускал бы незаполненные.
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            for post in batch:
+                render_text(post)
+            with transaction.atomic():
+                Post.objects.bulk_update(
+                    batch, ['text_html', 'excerpt_html'])
+            # bulk_update не шлет сигналы: карточки и страницы
+            # с прежним HTML сбрасываются здесь
+            bump_feeds(
+                Post.objects.filter(pk__in=[post.pk for post in batch]),
+                *(dependency('post', post.pk) for post in batch))
+            last_pk = batch[-1].pk
+            total += len(batch)
+            self.stdout.write(f'Обработано постов: {total}')
+        self.stdout.write(self.style.SUCCESS(f'Готово, постов: {total}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Раскладывает в ленты подписок посты авторов, '
+        'переставших быть популярными')
+
+    def handle(self, *args, **options):
+        settled = timeline.settle_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Авторов разложено: {settled}'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import warm_post
+
+
+class Command(BaseCommand):
+    help = 'Генерирует все миниатюры POST_THUMBNAILS для картинок постов'
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only('image')
+        for count, post in enumerate(posts.iterator(), 1):
+            try:
+                warm_post(post)
+            except Exception as error:
+                self.stderr.write(f'{post.image.name}: {error}')
+            if count % 100 == 0:
+                self.stdout.write(f'Обработано постов: {count}')
+        self.stdout.write(self.style.SUCCESS('Миниатюры готовы'))
@@ -0,0 +1,30 @@
+"""HTML текста поста, который раньше строили фильтры шаблонов.
+
+text_html — {{ post.text|linebreaks }} страницы поста, excerpt_html —
+{{ post.text|linebreaksbr }} первых POST_EXCERPT_WORDS слов для лент.
+Оба считаются при сохранении поста, а не при каждой отрисовке.
+"""
+import re
+from itertools import islice
+
+from django.conf import settings
+from django.template.defaultfilters import linebreaksbr
+from django.utils.html import linebreaks
+
+WORD = re.compile(r'\S+')
+
+
+def excerpt(text, words):
+    """Первые words слов text с сохранением переносов строк."""
+    matches = list(islice(WORD.finditer(text), words + 1))
+    if len(matches) <= words:
+        return text
+    return text[:matches[words - 1].end()] + '…'
+
+
+def render_text(post):
+    """Заполняет text_html и excerpt_html поста по его text."""
+    text = post.text or ''
+    post.text_html = linebreaks(text, autoescape=True)
+    post.excerpt_html = linebreaksbr(
+        excerpt(text, settings.POST_EXCERPT_WORDS))
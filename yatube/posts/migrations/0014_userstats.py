@@ -0,0 +1,62 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:08
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def create_stats(apps, schema_editor):
+    # Без строк статистики популярные авторы не считались бы такими
+    # (лента подписок), пока кто-то не запустит rebuild_user_stats
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserStats = apps.get_model('posts', 'UserStats')
+
+    def count_by(model_name, field):
+        model = apps.get_model('posts', model_name)
+        return Coalesce(Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field).annotate(total=Count('pk'))
+            .values('total')), 0)
+
+    users = User.objects.annotate(
+        posts_total=count_by('Post', 'author'),
+        follows_total=count_by('Follow', 'user'),
+        followers_total=count_by('Follow', 'author'),
+        comments_total=count_by('Comment', 'author'),
+    )
+    UserStats.objects.bulk_create((
+        UserStats(
+            user_id=user.pk,
+            posts_count=user.posts_total,
+            follows_count=user.follows_total,
+            followers_count=user.followers_total,
+            comments_count=user.comments_total,
+        ) for user in users.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0013_auto_20221216_1654'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('follows_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.RunPython(create_stats, migrations.RunPython.noop),
+    ]
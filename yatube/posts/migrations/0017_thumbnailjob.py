@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThumbnailJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Файл')),
+                ('geometry', models.CharField(max_length=50, verbose_name='Размер')),
+                ('options', models.TextField(default='{}', verbose_name='Параметры')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Взята воркером')),
+            ],
+            options={
+                'verbose_name': 'Задача миниатюры',
+                'verbose_name_plural': 'Задачи миниатюр',
+                'ordering': ('pk',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='thumbnailjob',
+            constraint=models.UniqueConstraint(fields=('name', 'geometry'), name='thumbnail_job_unique'),
+        ),
+    ]
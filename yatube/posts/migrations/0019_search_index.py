@@ -0,0 +1,93 @@
+"""Полнотекстовый индекс постов и комментариев.
+
+Схема и первичная индексация записаны здесь, а не взяты из
+posts.search: миграция не должна меняться вместе с кодом поиска.
+Основы слов считает тот же стеммер, что и запросы, иначе индекс
+не совпал бы с поиском.
+"""
+import re
+
+from django.db import migrations
+
+from posts.stemmer import stem
+
+WORD = re.compile(r'\w+')
+BATCH_SIZE = 10000
+
+SQLITE_TABLES = (
+    'CREATE VIRTUAL TABLE posts_post_fts USING fts5(text)',
+    'CREATE VIRTUAL TABLE posts_comment_fts '
+    'USING fts5(text, post_id UNINDEXED)',
+)
+SQLITE_DROP = (
+    'DROP TABLE IF EXISTS posts_post_fts',
+    'DROP TABLE IF EXISTS posts_comment_fts',
+)
+# Таблица -> ее колонки в индексе после text
+SQLITE_INDEXED = (
+    ('posts_post', ''),
+    ('posts_comment', ', post_id'),
+)
+POSTGRESQL_SCHEMA = (
+    "CREATE INDEX posts_post_text_search ON posts_post "
+    "USING GIN (to_tsvector('russian', text))",
+    "CREATE INDEX posts_comment_text_search ON posts_comment "
+    "USING GIN (to_tsvector('russian', text))",
+)
+POSTGRESQL_DROP = (
+    'DROP INDEX IF EXISTS posts_post_text_search',
+    'DROP INDEX IF EXISTS posts_comment_text_search',
+)
+
+
+def index_text(text):
+    return ' '.join(stem(word) for word in WORD.findall(text or ''))
+
+
+def backfill(cursor, table, columns):
+    after = 0
+    while True:
+        cursor.execute(
+            f'SELECT id, text{columns} FROM {table} WHERE id > %s '
+            f'ORDER BY id LIMIT %s', [after, BATCH_SIZE])
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        values = ', %s' * (len(rows[0]) - 2)
+        cursor.executemany(
+            f'INSERT INTO {table}_fts (rowid, text{columns}) '
+            f'VALUES (%s, %s{values})',
+            [(pk, index_text(text), *rest) for pk, text, *rest in rows])
+        after = rows[-1][0]
+
+
+def forwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_TABLES:
+            schema_editor.execute(statement)
+        with schema_editor.connection.cursor() as cursor:
+            for table, columns in SQLITE_INDEXED:
+                backfill(cursor, table, columns)
+    elif vendor == 'postgresql':
+        for statement in POSTGRESQL_SCHEMA:
+            schema_editor.execute(statement)
+
+
+def backwards(apps, schema_editor):
+    statements = {
+        'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP,
+    }.get(schema_editor.connection.vendor, ())
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
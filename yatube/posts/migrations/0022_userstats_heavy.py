@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_heavy(apps, schema_editor):
+    # Раньше популярность считалась по followers_count при каждом запросе
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(heavy=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_text_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='heavy',
+            field=models.BooleanField(default=False, verbose_name='Посты подмешиваются в ленты при чтении'),
+        ),
+        migrations.RunPython(mark_heavy, migrations.RunPython.noop),
+    ]
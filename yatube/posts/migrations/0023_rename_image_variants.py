@@ -0,0 +1,41 @@
+import json
+import os
+
+from django.core.files.storage import default_storage
+from django.db import migrations
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def rename_variants(apps, schema_editor):
+    # Варианты назывались по имени файла без каталога и расширения
+    # (posts/variants/{stem}-{width}.{ext}), теперь — по полному имени
+    Post = apps.get_model('posts', 'Post')
+    old_names = set()
+    posts = Post.objects.exclude(image_variants='').values_list(
+        'image', 'image_variants')
+    for image_name, variants in posts.iterator():
+        stem = os.path.splitext(os.path.basename(image_name))[0]
+        for image_format, widths in json.loads(variants).items():
+            extension = EXTENSIONS[image_format]
+            for width in widths:
+                old = f'posts/variants/{stem}-{width}.{extension}'
+                new = f'posts/variants/{image_name}-{width}.{extension}'
+                old_names.add(old)
+                if default_storage.exists(old) and not (
+                        default_storage.exists(new)):
+                    with default_storage.open(old) as source:
+                        default_storage.save(new, source)
+    for name in old_names:
+        default_storage.delete(name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_userstats_heavy'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_variants, migrations.RunPython.noop),
+    ]
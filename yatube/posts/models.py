@@ -1,6 +1,11 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 
+from .images import image_sources
+
 
 User = get_user_model()
 TEXT_POST = (
@@ -14,6 +19,13 @@ TEXT_COMMENT = (
 TEXT_FOLLOW = (
     '{} подписался на {}'
 )
+FEED_FIELDS = (
+    'text', 'pub_date', 'author', 'group',
+    'image', 'image_width', 'image_height', 'image_variants',
+    'comments_count', 'excerpt_html',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title',
+)
 
 
 class Group(models.Model):
@@ -39,6 +51,33 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа одним JOIN, только нужные поля.
+
+        Порядок — ключ курсора (pub_date, id), от новых к старым.
+        """
+        return self.select_related('author', 'group').only(
+            *FEED_FIELDS).order_by('-pub_date', '-pk')
+
+    def shift_comments(self, post_id, delta):
+        """Атомарно сдвигает comments_count поста, не уходя ниже нуля."""
+        return self.filter(
+            pk=post_id, comments_count__gte=max(-delta, 0)
+        ).update(comments_count=F('comments_count') + delta)
+
+    def reconcile_comments(self):
+        """Чинит comments_count, разошедшиеся с числом комментариев.
+
+        Возвращает число исправленных постов.
+        """
+        actual = count_by(Comment, 'post')
+        broken = self.annotate(actual=actual).exclude(
+            comments_count=F('actual')).values('pk')
+        return self.model.objects.filter(pk__in=broken).update(
+            comments_count=actual)
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст'
@@ -67,11 +106,54 @@ class Post(models.Model):
         help_text='Добавить картинку',
         verbose_name='Картинка'
     )
+    image_width = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Ширина картинки'
+    )
+    image_height = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Высота картинки'
+    )
+    image_variants = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Варианты картинки'
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев'
+    )
+    text_html = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Текст в HTML'
+    )
+    excerpt_html = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Начало текста в HTML'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = (
+            models.Index(fields=('pub_date',), name='post_date'),
+            models.Index(
+                fields=('author', 'pub_date'), name='post_author_date'),
+            models.Index(
+                fields=('group', 'pub_date'), name='post_group_date'),
+        )
+
+    @property
+    def image_sources(self):
+        return image_sources(self)
 
     def __str__(self):
         return TEXT_POST.format(
@@ -106,6 +188,10 @@ class Comment(models.Model):
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', 'created'), name='comment_post_created'),
+        )
 
     def __str__(self):
         return (
@@ -129,6 +215,178 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='follow_unique_user_author'),
+        )
 
     def __str__(self):
         return TEXT_FOLLOW.format(str(self.user), self.author)
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_date_post'),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='timeline_unique_user_post'),
+        )
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class ThumbnailJob(models.Model):
+    name = models.CharField(
+        max_length=255,
+        verbose_name='Файл'
+    )
+    geometry = models.CharField(
+        max_length=50,
+        verbose_name='Размер'
+    )
+    options = models.TextField(
+        default='{}',
+        verbose_name='Параметры'
+    )
+    created = models.DateTimeField(
+        'Дата создания',
+        auto_now_add=True
+    )
+    claimed_at = models.DateTimeField(
+        'Взята воркером',
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        ordering = ('pk',)
+        verbose_name = 'Задача миниатюры'
+        verbose_name_plural = 'Задачи миниатюр'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'geometry'), name='thumbnail_job_unique'),
+        )
+
+    def __str__(self):
+        return f'{self.name} {self.geometry}'
+
+
+def count_by(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total')), 0)
+
+
+class UserStatsManager(models.Manager):
+    def shift(self, user_id, field, delta):
+        """Атомарно сдвигает счетчик; отсутствующую строку не создает."""
+        return self.filter(
+            user_id=user_id, **{f'{field}__gte': max(-delta, 0)}
+        ).update(**{field: F(field) + delta})
+
+    @transaction.atomic
+    def rebuild(self, users=None):
+        """Пересчитывает статистику пользователей с нуля."""
+        stats = self.compute(User.objects.all() if users is None else users)
+        self.filter(user_id__in=[item.user_id for item in stats]).delete()
+        return self.bulk_create(stats)
+
+    def get_or_rebuild(self, user):
+        """Статистика user; отсутствующую строку считает с нуля.
+
+        Два запроса могут считать одну строку одновременно: вставка
+        пропускает конфликт, и оба читают строку, попавшую в базу.
+        """
+        stats = self.filter(user=user).first()
+        if stats is None:
+            self.bulk_create(
+                self.compute(User.objects.filter(pk=user.pk)),
+                ignore_conflicts=True)
+            stats = self.get(user=user)
+        return stats
+
+    def compute(self, users):
+        """Несохраненные строки статистики для queryset users."""
+        users = users.annotate(
+            posts_total=count_by(Post, 'author'),
+            follows_total=count_by(Follow, 'user'),
+            followers_total=count_by(Follow, 'author'),
+            comments_total=count_by(Comment, 'author'),
+            was_heavy=F('stats__heavy'),
+        )
+        # Популярным автор перестает только в timeline.settle
+        return [
+            self.model(
+                user_id=user.pk,
+                posts_count=user.posts_total,
+                follows_count=user.follows_total,
+                followers_count=user.followers_total,
+                comments_count=user.comments_total,
+                heavy=bool(user.was_heavy) or (
+                    user.followers_total > settings.TIMELINE_FANOUT_LIMIT),
+            ) for user in users
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов'
+    )
+    follows_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков'
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Комментариев'
+    )
+    heavy = models.BooleanField(
+        default=False,
+        verbose_name='Посты подмешиваются в ленты при чтении'
+    )
+
+    objects = UserStatsManager()
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
@@ -0,0 +1,211 @@
+"""Кеш целых страниц для анонимных посетителей.
+
+Страница хранится вместе со снимком версий своих зависимостей
+(вся лента, группа, автор, пост). Сигналы моделей и готовые
+миниатюры увеличивают версии, и при следующем запросе несовпадение снимка
+с текущими версиями заставляет отрисовать страницу заново.
+Проверка попадания — один get и один get_many, без запросов к базе.
+Устаревшую страницу перерисовывает только запрос, взявший блокировку;
+остальные в это время получают прежнюю копию, а не идут в базу разом.
+Версии растут в момент записи, а реплика получает запись позже,
+поэтому свежие изменения перерисовываются из default.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from core import replicas
+
+PAGE_KEY = 'page:{}'
+VERSION_KEY = 'page_version:{}'
+LOCK_KEY = 'page_lock:{}'
+LOOKUP_KEY = 'page_lookup:{}'
+
+
+def dependency(kind, pk=None):
+    return kind if pk is None else f'{kind}:{pk}'
+
+
+def new_version():
+    # Версия — момент изменения в наносекундах: вытесненный из кеша
+    # счетчик не совпадет со старым снимком, а максимум версий годится
+    # как Last-Modified.
+    return time.time_ns()
+
+
+def get_versions(dependencies):
+    keys = [VERSION_KEY.format(item) for item in dependencies]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def bump(*dependencies):
+    keys = [VERSION_KEY.format(item) for item in dependencies]
+    versions = cache.get_many(keys)
+    now = new_version()
+    # Версия только растет, даже если часы другого сервера отстают.
+    cache.set_many(
+        {key: max(now, versions.get(key, 0) + 1) for key in keys}, None)
+
+
+def bump_feeds(posts, *dependencies):
+    """Сбрасывает вместе с dependencies страницы с карточками posts.
+
+    Страница целиком зависит только от своей ленты, а имя автора,
+    группа и миниатюра лежат в карточке. Поэтому изменение строки
+    пользователя или группы и готовая миниатюра сбрасывают главную,
+    профили авторов и группы этих постов; страницы постов зависят
+    от автора и сбрасываются вместе с профилем.
+    """
+    rows = set(posts.order_by().values_list(
+        'author_id', 'group_id').distinct())
+    bump(
+        dependency('posts'),
+        *dependencies,
+        *{dependency('author', author_id) for author_id, _ in rows},
+        *{dependency('group', group_id)
+          for _, group_id in rows if group_id is not None})
+
+
+def depends_on(request, *dependencies):
+    """Отмечает, от каких данных зависит отрисованная страница.
+
+    Версии запоминаются до отрисовки: изменение, пришедшее во время
+    рендера, не попадет в кеш как свежее. Возвращает строку версий
+    для ключей фрагментного кеша или '', если страница не кешируется.
+    """
+    if not hasattr(request, 'page_versions'):
+        return ''
+    versions = get_versions(dependencies)
+    request.page_versions.update(versions)
+    return '-'.join(str(versions[key]) for key in sorted(versions))
+
+
+def lookup_key(name):
+    return LOOKUP_KEY.format(hashlib.md5(name.encode()).hexdigest())
+
+
+def lookup(name, query):
+    """Кеширует дешевый запрос, нужный до вызова view (pk по slug)."""
+    key = lookup_key(name)
+    value = cache.get(key)
+    if value is None:
+        value = query()
+        if value is not None:
+            cache.set(key, value, settings.PAGE_CACHE_TIMEOUT)
+    return value
+
+
+def forget(*names):
+    """Сбрасывает lookup() для переименованных и удаленных объектов."""
+    cache.delete_many([lookup_key(name) for name in names])
+
+
+def validators(request, dependencies):
+    """ETag и Last-Modified страницы по версиям ее зависимостей.
+
+    Last-Modified — конец секунды последнего изменения, и отдается он
+    только после нее: иначе правка в ту же секунду получила бы
+    по If-Modified-Since ответ 304 со старой страницей.
+    """
+    versions = get_versions(dependencies)
+    digest = hashlib.md5(request.get_full_path().encode())
+    for key in sorted(versions):
+        digest.update(f'{key}={versions[key]};'.encode())
+    last_modified = -(-max(versions.values()) // 10 ** 9)
+    if last_modified > time.time():
+        last_modified = None
+    return f'"{digest.hexdigest()}"', last_modified
+
+
+def replica_may_lag(versions):
+    """Последнее изменение могло еще не дойти до реплик."""
+    newest = max(versions.values(), default=0)
+    return time.time_ns() - newest < settings.REPLICA_STICKY_SECONDS * 10 ** 9
+
+
+def page_key(request):
+    return PAGE_KEY.format(
+        hashlib.md5(request.get_full_path().encode()).hexdigest())
+
+
+def cache_anonymous_page(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        key = page_key(request)
+        lock_key = None
+        cached = cache.get(key)
+        if cached is not None:
+            versions, response = cached
+            current = cache.get_many(list(versions))
+            if current == versions:
+                return response
+            lock_key = LOCK_KEY.format(key)
+            if not cache.add(
+                    lock_key, 1, settings.PAGE_CACHE_LOCK_TIMEOUT):
+                response.stale = True
+                return response
+            if replica_may_lag(current):
+                replicas.use_primary()
+        request.page_versions = {}
+        try:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and request.page_versions:
+                if replicas.reading_replica() and replica_may_lag(
+                        request.page_versions):
+                    # На реплике может не быть изменения, которое
+                    # уже отражено в версиях: не храним и не метим.
+                    response.stale = True
+                else:
+                    cache.set(
+                        key, (request.page_versions, response),
+                        settings.PAGE_CACHE_TIMEOUT)
+        finally:
+            if lock_key is not None:
+                cache.delete(lock_key)
+        return response
+    return wrapper
+
+
+def conditional_page(get_dependencies):
+    """Условный GET для анонимов: 304 без вызова view.
+
+    get_dependencies получает аргументы view и возвращает зависимости
+    страницы или None, если объекта нет. Авторизованным страница
+    отдается целиком: в ней есть личные части и фрагментный кеш.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            dependencies = get_dependencies(*args, **kwargs)
+            if dependencies is None:
+                return view(request, *args, **kwargs)
+            etag, last_modified = validators(request, dependencies)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            # Устаревшую копию из кеша нельзя метить новой версией.
+            if response.status_code == 200 and not getattr(
+                    response, 'stale', False):
+                response['ETag'] = etag
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,214 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Count, Window
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+CURSOR_SEPARATOR = '|'
+# Значение ?page= для последней страницы ленты
+LAST_PAGE = 'last'
+
+
+def encode_cursor(obj, field='pub_date'):
+    """Непрозрачный токен позиции в ленте: (дата field, id) в base64."""
+    raw = f'{getattr(obj, field).isoformat()}{CURSOR_SEPARATOR}{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (дату, id) или None для битого токена."""
+    try:
+        raw = base64.urlsafe_b64decode(
+            token + '=' * (-len(token) % 4)).decode()
+        pub_date, pk = raw.rsplit(CURSOR_SEPARATOR, 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CountingPaginator(Paginator):
+    """Paginator, берущий число объектов из готового счетчика.
+
+    counter — функция без аргументов, например обертка над
+    counters.count_posts; без нее работает как обычный Paginator.
+    """
+    def __init__(self, object_list, per_page, counter=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.counter = counter
+
+    @cached_property
+    def count(self):
+        if self.counter is None:
+            return super().count
+        return self.counter()
+
+
+def page_window(page, on_each_side=3, on_ends=1, last=None):
+    """Номера ссылок пагинатора: края и окрестность текущей страницы.
+
+    Пропуски обозначены None. Для сотен тысяч страниц шаблон
+    выводит несколько ссылок вместо page_range целиком. Номера
+    больше last не выводятся: конец ленты открывает ссылка
+    «Последняя» по ключу, без OFFSET.
+    """
+    num_pages = page.paginator.num_pages
+    if last is None or last >= num_pages:
+        last = num_pages
+        ends = range(max(num_pages - on_ends + 1, 1), num_pages + 1)
+    else:
+        ends = ()
+    shown = sorted(
+        {*range(1, min(on_ends, last) + 1),
+         *range(max(page.number - on_each_side, 1),
+                min(page.number + on_each_side, last) + 1),
+         *ends})
+    window = []
+    for number in shown:
+        if window and number - window[-1] == 2:
+            window.append(number - 1)
+        elif window and number - window[-1] > 2:
+            window.append(None)
+        window.append(number)
+    if last < num_pages:
+        window.append(None)
+    return window
+
+
+class CursorPage(Page):
+    """Страница ленты без номера: соседние страницы адресуются токенами."""
+    def __init__(self, object_list, paginator, cursor='',
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, 1, paginator)
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Cursor page {self.cursor or "first"}>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def next_page_number(self):
+        return self.next_cursor
+
+    def previous_page_number(self):
+        return self.previous_cursor
+
+    def start_index(self):
+        return 1 if self.object_list else 0
+
+    def end_index(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (pub_date, id).
+
+    Вместо OFFSET и COUNT(*) выбирает per_page + 1 строк после (или до)
+    ключа последнего показанного поста, поэтому стоимость запроса
+    не зависит от глубины страницы. Последняя страница — первые
+    per_page строк в обратном порядке.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def get_page(self, after=None, before=None, last=False):
+        if last:
+            return self._page_before(None, LAST_PAGE)
+        if before:
+            key = decode_cursor(before)
+            if key is not None:
+                return self._page_before(key, before)
+        if after:
+            key = decode_cursor(after)
+            if key is not None:
+                return self._page_after(key, after)
+        return self._page_after(None, '')
+
+    def select(self, key, limit, ascending=False):
+        """limit постов за ключом key: старее него, а при ascending новее."""
+        if ascending:
+            queryset = self.object_list.order_by('pub_date', 'pk')
+            if key is not None:
+                pub_date, pk = key
+                queryset = queryset.filter(pub_date__gte=pub_date).exclude(
+                    pub_date=pub_date, pk__lte=pk)
+        else:
+            queryset = self.object_list.order_by('-pub_date', '-pk')
+            if key is not None:
+                pub_date, pk = key
+                queryset = queryset.filter(pub_date__lte=pub_date).exclude(
+                    pub_date=pub_date, pk__gte=pk)
+        return list(queryset[:limit])
+
+    def _page_after(self, key, token):
+        posts = self.select(key, self.per_page + 1)
+        has_more = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        return CursorPage(
+            posts, self, cursor=token,
+            next_cursor=(
+                encode_cursor(posts[-1]) if has_more else None),
+            previous_cursor=(
+                encode_cursor(posts[0]) if key is not None and posts
+                else None),
+        )
+
+    def _page_before(self, key, token):
+        """Страница перед ключом key, а без ключа — последняя страница."""
+        posts = self.select(key, self.per_page + 1, ascending=True)
+        if not posts:
+            return self._page_after(None, '')
+        has_more = len(posts) > self.per_page
+        posts = posts[:self.per_page][::-1]
+        return CursorPage(
+            posts, self, cursor=token,
+            next_cursor=(
+                encode_cursor(posts[-1]) if key is not None else None),
+            previous_cursor=(
+                encode_cursor(posts[0]) if has_more else None),
+        )
+
+
+class CommentPaginator:
+    """Комментарии поста от старых к новым, keyset-пагинация по (created, id).
+
+    Один запрос выбирает per_page + 1 комментариев после курсора и
+    оконной функцией COUNT(*) OVER () — сколько их осталось начиная
+    с курсора; для первой страницы это общее число комментариев.
+    """
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def get_page(self, after=None):
+        key = decode_cursor(after) if after else None
+        queryset = self.object_list.order_by('created', 'pk').annotate(
+            remaining=Window(Count('pk')))
+        if key is not None:
+            created, pk = key
+            queryset = queryset.filter(created__gte=created).exclude(
+                created=created, pk__lte=pk)
+        comments = list(queryset[:self.per_page + 1])
+        has_more = len(comments) > self.per_page
+        comments = comments[:self.per_page]
+        page = CursorPage(
+            comments, self, cursor=after if key is not None else '',
+            next_cursor=(
+                encode_cursor(comments[-1], 'created') if has_more
+                else None))
+        page.remaining = comments[0].remaining if comments else 0
+        return page
@@ -0,0 +1,304 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+SQLite: виртуальные таблицы FTS5 posts_post_fts и posts_comment_fts
+хранят основы слов (stemmer.stem). Стемминг выполняется в Python:
+сигналы Post и Comment переписывают строку индекса при сохранении и
+удалении, а массовые загрузки (bulk_create, INSERT в обход ORM)
+индексируются блоком deferred_index или функцией reindex. Схема
+не зависит от функций Python, поэтому с базой работают и соединения
+не из Django (консоль sqlite3, резервное копирование).
+PostgreSQL: GIN-индексы по to_tsvector('russian', text).
+
+Совпадение в комментарии тоже находит пост, но весит вдвое меньше.
+"""
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .stemmer import stem
+
+WORD = re.compile(r'\w+')
+COMMENT_WEIGHT = 0.5
+REINDEX_BATCH_SIZE = 10000
+
+# Таблица -> ее колонки в индексе после text. Сами таблицы FTS5
+# создает миграция 0019_search_index.
+SQLITE_INDEXED = {
+    'posts_post': (),
+    'posts_comment': ('post_id',),
+}
+SQLITE_IDS = '''
+    SELECT rowid AS post_id FROM posts_post_fts WHERE posts_post_fts MATCH %s
+    UNION
+    SELECT post_id FROM posts_comment_fts WHERE posts_comment_fts MATCH %s
+'''
+# Ранг SQLite — bm25, чем меньше, тем лучше. Он считается для каждого
+# совпадения, поэтому ранжируются только SEARCH_RANK_LIMIT новейших
+# совпадений каждой таблицы: FTS5 перебирает их по rowid и дальше
+# не идет. Остальные посты идут после них от новых к старым.
+SQLITE_RANKED = f'''
+    SELECT post_id FROM (
+        SELECT * FROM (
+            SELECT rowid AS post_id, bm25(posts_post_fts) AS rank
+            FROM posts_post_fts WHERE posts_post_fts MATCH %s
+            ORDER BY rowid DESC LIMIT %s)
+        UNION ALL
+        SELECT * FROM (
+            SELECT post_id, bm25(posts_comment_fts) * {COMMENT_WEIGHT}
+            FROM posts_comment_fts WHERE posts_comment_fts MATCH %s
+            ORDER BY rowid DESC LIMIT %s)
+    ) GROUP BY post_id ORDER BY MIN(rank), post_id DESC
+'''
+POSTGRESQL_IDS = '''
+    SELECT id AS post_id FROM posts_post
+    WHERE to_tsvector('russian', text) @@ plainto_tsquery('russian', %s)
+    UNION
+    SELECT post_id FROM posts_comment
+    WHERE to_tsvector('russian', text) @@ plainto_tsquery('russian', %s)
+'''
+POSTGRESQL_RANKED = f'''
+    SELECT post_id FROM (
+        (SELECT id AS post_id,
+            ts_rank(to_tsvector('russian', text), query) AS rank
+        FROM posts_post, plainto_tsquery('russian', %s) query
+        WHERE to_tsvector('russian', text) @@ query
+        ORDER BY id DESC LIMIT %s)
+        UNION ALL
+        (SELECT post_id,
+            ts_rank(to_tsvector('russian', text), query) * {COMMENT_WEIGHT}
+        FROM posts_comment, plainto_tsquery('russian', %s) query
+        WHERE to_tsvector('russian', text) @@ query
+        ORDER BY id DESC LIMIT %s)
+    ) matches
+    GROUP BY post_id ORDER BY MAX(rank) DESC, post_id DESC
+'''
+# Посты после ранжированных. ORDER BY у самого UNION позволяет SQLite
+# слить два потока, упорядоченных по rowid, и остановиться на
+# OFFSET + LIMIT, а не сортировать все совпадения.
+SQLITE_UNRANKED = '''
+    SELECT rowid FROM posts_post_fts
+    WHERE posts_post_fts MATCH %s AND rowid NOT IN ({ranked})
+    UNION
+    SELECT post_id FROM posts_comment_fts
+    WHERE posts_comment_fts MATCH %s AND post_id NOT IN ({ranked})
+    ORDER BY 1 DESC LIMIT %s OFFSET %s
+'''
+POSTGRESQL_UNRANKED = '''
+    SELECT id FROM posts_post
+    WHERE to_tsvector('russian', text) @@ plainto_tsquery('russian', %s)
+    AND id NOT IN ({ranked})
+    UNION
+    SELECT post_id FROM posts_comment
+    WHERE to_tsvector('russian', text) @@ plainto_tsquery('russian', %s)
+    AND post_id NOT IN ({ranked})
+    ORDER BY 1 DESC LIMIT %s OFFSET %s
+'''
+# Точное число совпадений частого слова стоит обхода всего индекса,
+# поэтому счет останавливается на SEARCH_COUNT_LIMIT + 1. ORDER BY
+# у самого UNION, как в SQLITE_UNRANKED: без него SQLite собирает все
+# совпадения во временное дерево и только потом применяет LIMIT.
+COUNT = 'SELECT COUNT(*) FROM ({} ORDER BY 1 DESC LIMIT %s) capped'
+
+
+def index_text(text):
+    """Текст для FTS5: основы слов через пробел."""
+    return ' '.join(stem(word) for word in WORD.findall(text or ''))
+
+
+def index_rows(table, rows, using='default'):
+    """Переписывает строки индекса: rows — (id, text, *колонки)."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not rows:
+        return
+    columns = ''.join(f', {column}' for column in SQLITE_INDEXED[table])
+    values = ', %s' * len(SQLITE_INDEXED[table])
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {table}_fts WHERE rowid = %s',
+            [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {table}_fts (rowid, text{columns}) '
+            f'VALUES (%s, %s{values})',
+            [(pk, index_text(text), *rest) for pk, text, *rest in rows])
+
+
+def unindex_rows(table, ids, using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {table}_fts WHERE rowid = %s',
+            [(pk,) for pk in ids])
+
+
+def reindex(table, using='default', after=0):
+    """Индексирует строки таблицы с id больше after пачками по id."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    columns = ''.join(f', {column}' for column in SQLITE_INDEXED[table])
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT id, text{columns} FROM {table} WHERE id > %s '
+                f'ORDER BY id LIMIT %s', [after, REINDEX_BATCH_SIZE])
+            rows = cursor.fetchall()
+        if not rows:
+            return
+        index_rows(table, rows, using)
+        after = rows[-1][0]
+
+
+def last_ids(using):
+    with connections[using].cursor() as cursor:
+        ids = {}
+        for table in SQLITE_INDEXED:
+            cursor.execute(f'SELECT MAX(id) FROM {table}')
+            ids[table] = cursor.fetchone()[0] or 0
+        return ids
+
+
+@contextmanager
+def deferred_index(using='default'):
+    """Массовая загрузка постов и комментариев в обход сигналов.
+
+    Новые строки (id больше прежнего максимума) индексируются пачками
+    на выходе из блока. Правки старых строк, сделанные внутри блока
+    без save(), в индекс не попадут. В PostgreSQL GIN-индекс
+    обновляется самой базой, и блок ничего не делает.
+    """
+    if connections[using].vendor != 'sqlite':
+        yield
+        return
+    start = last_ids(using)
+    try:
+        yield
+    finally:
+        for table, after in start.items():
+            reindex(table, using, after)
+
+
+def query_stems(query):
+    return list(dict.fromkeys(
+        stem(word) for word in WORD.findall(query or '')))
+
+
+def search_params(query, vendor):
+    """Параметры поиска для базы vendor или None, если искать нечего."""
+    stems = query_stems(query)
+    if not stems:
+        return None
+    if vendor == 'postgresql':
+        return (
+            POSTGRESQL_IDS, POSTGRESQL_RANKED, POSTGRESQL_UNRANKED,
+            [query, query])
+    # Каждая основа в кавычках: пользовательский ввод не становится
+    # синтаксисом FTS5.
+    match = ' '.join(f'"{item}"' for item in stems)
+    return SQLITE_IDS, SQLITE_RANKED, SQLITE_UNRANKED, [match, match]
+
+
+def filter_matching(queryset, query):
+    """Посты queryset, в которых или в комментариях к которым есть query."""
+    params = search_params(query, connections[queryset.db].vendor)
+    if params is None:
+        return queryset.none()
+    ids, *_, args = params
+    # Не pk__in=RawSQL(...): SQLite прочитает IN ((подзапрос)) как
+    # сравнение с первой строкой подзапроса.
+    return queryset.extra(
+        where=[f'{queryset.model._meta.db_table}.id IN ({ids})'],
+        params=args)
+
+
+def highlight(text, stems, size=None):
+    """Фрагмент текста вокруг первого совпадения с <mark> на словах."""
+    size = size or settings.SEARCH_SNIPPET_WORDS
+    words = WORD.findall(text)
+    # gaps[i] — текст между словами i - 1 и i
+    gaps = WORD.split(text)
+    hits = {i for i, word in enumerate(words) if stem(word) in stems}
+    first = max(0, min(hits, default=0) - size // 3)
+    last = min(len(words), first + size)
+    parts = ['…'] if first else [escape(gaps[0])]
+    for i in range(first, last):
+        if i > first:
+            parts.append(escape(gaps[i]))
+        word = escape(words[i])
+        parts.append(f'<mark>{word}</mark>' if i in hits else word)
+    parts.append('…' if last < len(words) else escape(gaps[last]))
+    return mark_safe(''.join(parts))
+
+
+class SearchResults:
+    """Список найденных постов для Paginator: считает и режет запросом.
+
+    Счет ограничен SEARCH_COUNT_LIMIT: если совпадений больше,
+    count() возвращает лимит, а truncated становится True, так что
+    и ссылки пагинатора доходят только до лимита.
+    Посты страницы получают атрибут snippet с подсвеченным фрагментом.
+    """
+    def __init__(self, query, queryset):
+        self.stems = set(query_stems(query))
+        self.queryset = queryset
+        self.connection = connections[queryset.db]
+        self.params = search_params(query, self.connection.vendor)
+        self._ranked = None
+        self.truncated = False
+
+    def count(self):
+        if self.params is None:
+            return 0
+        ids, *_, args = self.params
+        limit = settings.SEARCH_COUNT_LIMIT
+        with self.connection.cursor() as cursor:
+            cursor.execute(COUNT.format(ids), [*args, limit + 1])
+            count = cursor.fetchone()[0]
+        self.truncated = count > limit
+        return min(count, limit)
+
+    def __len__(self):
+        return self.count()
+
+    def ranked(self):
+        """Ранжированные id из новейших совпадений, один запрос."""
+        if self._ranked is None:
+            _, ranked, _, (post_match, comment_match) = self.params
+            limit = settings.SEARCH_RANK_LIMIT
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    ranked, [post_match, limit, comment_match, limit])
+                self._ranked = [row[0] for row in cursor.fetchall()]
+        return self._ranked
+
+    def select(self, start, stop):
+        ranked = self.ranked()
+        selected = ranked[start:stop]
+        # Пустой ranked — совпадений нет вовсе
+        if ranked and stop > len(ranked):
+            _, _, unranked, (post_match, comment_match) = self.params
+            sql = unranked.format(ranked=', '.join(['%s'] * len(ranked)))
+            with self.connection.cursor() as cursor:
+                cursor.execute(sql, [
+                    post_match, *ranked, comment_match, *ranked,
+                    stop - max(start, len(ranked)),
+                    max(start - len(ranked), 0)])
+                selected += [row[0] for row in cursor.fetchall()]
+        return selected
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if self.params is None:
+            return []
+        ids = self.select(index.start, index.stop)
+        posts = self.queryset.in_bulk(ids)
+        results = [posts[pk] for pk in ids if pk in posts]
+        for post in results:
+            post.snippet = highlight(post.text, self.stems)
+        return results
@@ -0,0 +1,248 @@
+from django.db.models import DEFERRED
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import images, markup, search, thumbnails, timeline
+from .counters import change_counters, counter_key, shift_counter
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .page_cache import bump, bump_feeds, dependency, forget
+
+USER_STATS_FIELDS = {
+    Post: 'posts_count',
+    Comment: 'comments_count',
+}
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # Читаем через __dict__, чтобы не подгружать отложенное поле.
+    instance._counted_group_id = instance.__dict__.get('group_id', DEFERRED)
+    instance._page_group_id = instance._counted_group_id
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    image = instance.__dict__.get('image', DEFERRED)
+    instance._queued_image = getattr(image, 'name', image)
+
+
+@receiver(post_init, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    instance._lookup_slug = instance.__dict__.get('slug', DEFERRED)
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._lookup_username = instance.__dict__.get('username', DEFERRED)
+
+
+@receiver(pre_save, sender=Post)
+def render_text(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'text' not in update_fields):
+        return
+    markup.render_text(instance)
+
+
+@receiver(post_save, sender=Post)
+def process_image(sender, instance, raw=False, **kwargs):
+    old_image = instance._queued_image
+    instance._queued_image = instance.image.name
+    if raw or instance.image.name == old_image:
+        return
+    if isinstance(old_image, str):
+        # image_variants в базе еще описывает прежнюю картинку
+        images.delete_variants(
+            instance.image.storage,
+            images.variant_names(old_image, instance.image_variants))
+    images.update_variants(instance)
+    if instance.image:
+        thumbnails.enqueue_post(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_variants(sender, instance, **kwargs):
+    # До удаления строки: отложенные поля еще можно загрузить
+    instance._variant_names = images.variant_names(
+        instance.image.name, instance.image_variants)
+
+
+@receiver(post_delete, sender=Post)
+def delete_variants(sender, instance, **kwargs):
+    images.delete_variants(
+        instance.image.storage, getattr(instance, '_variant_names', []))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index_rows(
+            'posts_post', [(instance.pk, instance.text)], using)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is None or {'text', 'post'} & set(update_fields):
+        search.index_rows(
+            'posts_comment',
+            [(instance.pk, instance.text, instance.post_id)], using)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def unindex_content(sender, instance, using, **kwargs):
+    search.unindex_rows(sender._meta.db_table, [instance.pk], using)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    old_group_id = instance._counted_group_id
+    instance._counted_group_id = instance.group_id
+    if created:
+        change_counters(instance, 1, instance.group_id)
+    elif old_group_id not in (DEFERRED, instance.group_id):
+        if old_group_id is not None:
+            shift_counter(counter_key('group_id', old_group_id), -1)
+        if instance.group_id is not None:
+            shift_counter(counter_key('group_id', instance.group_id), 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_counters(instance, -1, instance.group_id)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def count_user_content(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.shift(
+            instance.author_id, USER_STATS_FIELDS[sender], 1)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def uncount_user_content(sender, instance, **kwargs):
+    UserStats.objects.shift(instance.author_id, USER_STATS_FIELDS[sender], -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.shift_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    Post.objects.shift_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.shift(instance.user_id, 'follows_count', 1)
+        UserStats.objects.shift(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    UserStats.objects.shift(instance.user_id, 'follows_count', -1)
+    UserStats.objects.shift(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, using, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance, using)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, using, raw=False, **kwargs):
+    if created and not raw:
+        # followers_count уже увеличен в count_follow
+        timeline.promote(instance.author_id, using)
+        timeline.backfill(instance.user_id, instance.author_id, using)
+
+
+@receiver(post_delete, sender=Follow)
+def drop_timeline(sender, instance, **kwargs):
+    timeline.drop(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def expire_post_pages(sender, instance, **kwargs):
+    bump(
+        dependency('posts'),
+        dependency('post', instance.pk),
+        dependency('author', instance.author_id),
+        *{dependency('group', pk) for pk in (
+            instance.group_id, instance._page_group_id) if pk is not None})
+    instance._page_group_id = instance.group_id
+    forget(f'post:{instance.pk}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def expire_comment_pages(sender, instance, **kwargs):
+    # Число комментариев есть в карточке поста, поэтому сбрасываются
+    # и ленты с ним: главная, профиль автора поста и группа.
+    dependencies = [
+        dependency('post', instance.post_id),
+        dependency('author', instance.author_id)]
+    post = Post.objects.filter(pk=instance.post_id).values_list(
+        'author_id', 'group_id').first()
+    if post is not None:
+        author_id, group_id = post
+        dependencies += [dependency('posts'), dependency('author', author_id)]
+        if group_id is not None:
+            dependencies.append(dependency('group', group_id))
+    bump(*dependencies)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def expire_follow_pages(sender, instance, **kwargs):
+    bump(
+        dependency('author', instance.user_id),
+        dependency('author', instance.author_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def expire_group_pages(sender, instance, **kwargs):
+    # До удаления: SET_NULL отвяжет посты от группы без сигналов.
+    bump_feeds(
+        Post.objects.filter(group_id=instance.pk),
+        dependency('group', instance.pk),
+        dependency('group_row', instance.pk))
+    # Прежний slug мог перейти к другой группе
+    slug = instance.__dict__.get('slug', DEFERRED)
+    forget(*{f'group:{value}' for value in (
+        slug, instance._lookup_slug) if value is not DEFERRED})
+    instance._lookup_slug = slug
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def expire_user_pages(sender, instance, update_fields=None, **kwargs):
+    # Вход обновляет только last_login — страницы от него не меняются.
+    if update_fields != frozenset({'last_login'}):
+        # Имя показано и в карточках постов, и в комментариях.
+        bump_feeds(
+            Post.objects.filter(author_id=instance.pk),
+            dependency('author', instance.pk),
+            dependency('user_row', instance.pk),
+            *(dependency('post', pk) for pk in Comment.objects.filter(
+                author_id=instance.pk).order_by().values_list(
+                    'post_id', flat=True).distinct()))
+        username = instance.__dict__.get('username', DEFERRED)
+        forget(*{f'author:{value}' for value in (
+            username, instance._lookup_username) if value is not DEFERRED})
+        instance._lookup_username = username
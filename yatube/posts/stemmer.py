@@ -0,0 +1,114 @@
+"""Стеммер Snowball для русского языка.
+
+Повторяет алгоритм https://snowballstem.org/algorithms/russian/stemmer.html,
+которым пользуется словарь russian в PostgreSQL, поэтому поиск в SQLite
+и подсветка совпадений находят те же формы слов.
+"""
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    (),
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    (),
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+     'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+     'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+     'ья', 'я'),
+)
+SUPERLATIVE = ((), ('ейш', 'ейше'))
+DERIVATIONAL = ((), ('ост', 'ость'))
+
+
+def regions(word):
+    """Начала областей RV и R2 (см. описание алгоритма)."""
+    rv = next(
+        (i + 1 for i, char in enumerate(word) if char in VOWELS), len(word))
+    r1 = after_vowel_consonant(word, 0)
+    return rv, after_vowel_consonant(word, r1)
+
+
+def after_vowel_consonant(word, start):
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def remove(word, start, endings):
+    """Отрезает самое длинное окончание из endings, лежащее в word[start:].
+
+    Окончания первой группы отрезаются только после «а» или «я».
+    Возвращает None, если окончание не найдено.
+    """
+    after_a, plain = endings
+    candidates = sorted(
+        [(ending, True) for ending in after_a]
+        + [(ending, False) for ending in plain],
+        key=lambda item: -len(item[0]))
+    for ending, needs_a in candidates:
+        if not word.endswith(ending) or len(word) - len(ending) < start:
+            continue
+        stem = word[:-len(ending)]
+        if needs_a and not (len(stem) > start and stem[-1] in 'ая'):
+            return None
+        return stem
+    return None
+
+
+def remove_adjectival(word, start):
+    stem = remove(word, start, ADJECTIVE)
+    if stem is None:
+        return None
+    participle = remove(stem, start, PARTICIPLE)
+    return stem if participle is None else participle
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = regions(word)
+    result = remove(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        word = remove(word, rv, REFLEXIVE) or word
+        for step in (
+            lambda: remove_adjectival(word, rv),
+            lambda: remove(word, rv, VERB),
+            lambda: remove(word, rv, NOUN),
+        ):
+            result = step()
+            if result is not None:
+                break
+    word = word if result is None else result
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = remove(word, r2, DERIVATIONAL) or word
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    superlative = remove(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+        return word
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
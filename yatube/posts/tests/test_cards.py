@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.fragments import get_metrics
+
+from ..cards import METRICS_NAME, render_cards
+from ..models import Comment, Group, Post, User
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(3))
+
+    def setUp(self):
+        cache.clear()
+
+    def cards(self, **kwargs):
+        return render_cards(
+            Post.objects.for_feed().order_by('pk'), **kwargs)
+
+    def test_only_changed_card_is_rendered(self):
+        first = self.cards()
+        self.assertEqual(get_metrics(METRICS_NAME)['misses'], 3)
+        self.assertEqual(self.cards(), first)
+        self.assertEqual(get_metrics(METRICS_NAME)['hits'], 3)
+        post = Post.objects.order_by('pk').last()
+        post.text = 'Исправленный пост'
+        post.save()
+        Comment.objects.create(
+            post=Post.objects.order_by('pk').first(),
+            author=self.user, text='Комментарий')
+        cards = self.cards()
+        self.assertEqual(get_metrics(METRICS_NAME)['misses'], 5)
+        self.assertEqual(cards[1], first[1])
+        self.assertIn('Комментариев: 1', cards[0])
+        self.assertIn('Исправленный пост', cards[2])
+
+    def test_author_and_group_changes_reach_cards(self):
+        self.cards()
+        self.user.first_name = 'Лев'
+        self.user.save()
+        self.group.title = 'Новое название'
+        self.group.save()
+        card = self.cards()[0]
+        self.assertIn('Лев', card)
+        self.assertIn('Новое название', card)
+
+    def test_group_page_variant(self):
+        self.assertIn('#Группа', self.cards()[0])
+        self.assertNotIn('#Группа', self.cards(group=self.group)[0])
+        response = Client().get(reverse('posts:group_list', args=['group']))
+        self.assertNotContains(response, '#Группа')
+        self.assertContains(response, 'Пост 0')
@@ -1,11 +1,21 @@
+import json
 import tempfile
+from io import BytesIO
+from unittest import mock
 
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase, Client, override_settings
 from django import forms
 from django.urls import reverse
 from django.conf import settings
+from django.utils.datastructures import MultiValueDict
 
+from ..images import variant_names
+from ..forms import IMAGE_NOT_PROCESSED, IMAGE_TOO_LARGE, PostForm
 from ..models import Post, Group, User, Comment
 
 SLUG = 'Yandex'
@@ -93,6 +103,168 @@ class PostFormTests(TestCase):
             post.image.name,
             f'{POST_UPLOAD_TO}{form_data["image"]}')
 
+    def test_create_post_builds_image_variants(self):
+        """Загрузка картинки строит варианты ширин и пишет размеры."""
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 600), 'green').save(buffer, 'JPEG')
+        self.authorized_client.post(CREATE_URL, data={
+            'text': 'Пост с большой картинкой',
+            'image': SimpleUploadedFile(
+                'big.jpg', buffer.getvalue(), content_type='image/jpeg'),
+        })
+        post = Post.objects.get(text='Пост с большой картинкой')
+        self.assertEqual((post.image_width, post.image_height), (1200, 600))
+        source = post.image_sources[-1]
+        self.assertEqual(source['type'], 'image/jpeg')
+        for width in settings.POST_IMAGE_WIDTHS:
+            with self.subTest(width=width):
+                self.assertIn(f' {width}w', source['srcset'])
+        content = self.authorized_client.get(PROFILE_URL).content.decode()
+        self.assertIn(source['srcset'], content)
+        self.assertIn('width="1200" height="600"', content)
+
+    def test_variants_removed_with_image(self):
+        """Варианты по полному имени удаляются при замене и удалении."""
+        def image(name):
+            buffer = BytesIO()
+            Image.new('RGB', (400, 200), 'green').save(buffer, 'JPEG')
+            return SimpleUploadedFile(
+                name, buffer.getvalue(), content_type='image/jpeg')
+
+        def run_commit_hooks():
+            callbacks, connection.run_on_commit = (
+                connection.run_on_commit, [])
+            for _, callback in callbacks:
+                callback()
+
+        post = Post.objects.create(
+            author=self.user, text='Варианты', image=image('same.jpg'))
+        old = variant_names(post.image.name, post.image_variants)
+        self.assertTrue(old)
+        self.assertTrue(all(name.startswith(
+            f'posts/variants/{post.image.name}-') for name in old))
+        self.assertTrue(all(map(default_storage.exists, old)))
+        post.image = image('same.jpg')
+        post.save()
+        run_commit_hooks()
+        new = variant_names(post.image.name, post.image_variants)
+        self.assertFalse(set(old) & set(new))
+        self.assertFalse(any(map(default_storage.exists, old)))
+        self.assertTrue(all(map(default_storage.exists, new)))
+        Post.objects.filter(pk=post.pk).delete()
+        run_commit_hooks()
+        self.assertFalse(any(map(default_storage.exists, new)))
+
+    def test_feed_renders_variants_before_pillow_init(self):
+        """Лента с вариантами рендерится в процессе без Image.init()."""
+        post = Post.objects.create(
+            author=self.user, text='Пост из другого процесса',
+            image=SimpleUploadedFile(
+                'fresh.gif', SMALL_GIF, content_type='image/gif'))
+        Post.objects.filter(pk=post.pk).update(
+            image_width=2, image_height=1,
+            image_variants=json.dumps({'WEBP': [2], 'JPEG': [2]}))
+        cache.clear()
+        with mock.patch.dict(Image.MIME, clear=True):
+            response = self.guest_client.get(INDEX_URL)
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('type="image/webp"', content)
+        self.assertIn('type="image/jpeg"', content)
+
+    def test_large_upload_is_downscaled_without_exif(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', (settings.POST_IMAGE_MAX_SIDE * 2, 100)).save(
+            buffer, 'JPEG', exif=exif)
+        self.authorized_client.post(CREATE_URL, data={
+            'text': 'Панорама',
+            'image': SimpleUploadedFile(
+                'wide.jpg', buffer.getvalue(), content_type='image/jpeg'),
+        })
+        post = Post.objects.get(text='Панорама')
+        with Image.open(post.image) as image:
+            self.assertEqual(image.width, settings.POST_IMAGE_MAX_SIDE)
+            self.assertNotIn('exif', image.info)
+
+    def test_png_upload_loses_exif(self):
+        """EXIF удаляется и из PNG, большой он или нет."""
+        exif = Image.Exif()
+        exif[0x010F] = 'SecretCam'
+        for width in (settings.POST_IMAGE_MAX_SIDE * 2, 300):
+            with self.subTest(width=width):
+                buffer = BytesIO()
+                Image.new('RGB', (width, 200)).save(
+                    buffer, 'PNG', exif=exif)
+                form = PostForm({'text': 'Снимок'}, {
+                    'image': SimpleUploadedFile(
+                        'photo.png', buffer.getvalue(),
+                        content_type='image/png')})
+                self.assertTrue(form.is_valid())
+                result = form.cleaned_data['image']
+                with Image.open(result) as image:
+                    self.assertEqual(image.format, 'PNG')
+                    self.assertNotIn('exif', image.info)
+                    self.assertFalse(image.getexif())
+                result.close()
+
+    def test_downscaled_upload_closed_with_request(self):
+        """Замененный оригинал закрыт, результат закроет запрос."""
+        buffer = BytesIO()
+        Image.new('RGB', (settings.POST_IMAGE_MAX_SIDE * 2, 100)).save(
+            buffer, 'JPEG')
+        upload = SimpleUploadedFile(
+            'wide.jpg', buffer.getvalue(), content_type='image/jpeg')
+        files = MultiValueDict({'image': [upload]})
+        form = PostForm({'text': 'Панорама'}, files)
+        self.assertTrue(form.is_valid())
+        self.assertTrue(upload.closed)
+        self.assertEqual(files.getlist('image'), [
+            upload, form.cleaned_data['image']])
+        form.cleaned_data['image'].close()
+
+    def test_unwritable_format_saved_as_jpeg(self):
+        """Формат, который Pillow не пишет, пересохраняется в JPEG."""
+        buffer = BytesIO()
+        Image.new('P', (settings.POST_IMAGE_MAX_SIDE * 2, 10)).save(
+            buffer, 'GIF')
+        Image.init()
+        with mock.patch.dict(Image.SAVE):
+            del Image.SAVE['GIF']
+            form = PostForm({'text': 'Слой'}, {'image': SimpleUploadedFile(
+                'layer.gif', buffer.getvalue(), content_type='image/gif')})
+            self.assertTrue(form.is_valid())
+        result = form.cleaned_data['image']
+        self.assertEqual(result.name, 'layer.jpeg')
+        self.assertEqual(result.content_type, 'image/jpeg')
+        with Image.open(result) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.width, settings.POST_IMAGE_MAX_SIDE)
+        result.close()
+
+    def test_unprocessed_upload_is_form_error(self):
+        """Ошибка пересохранения — ошибка формы, а не 500."""
+        with mock.patch(
+                'posts.forms.downscale_upload', side_effect=OSError):
+            form = PostForm({'text': 'Слой'}, {'image': SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif')})
+            self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['image'], [IMAGE_NOT_PROCESSED])
+
+    @override_settings(POST_IMAGE_MAX_MEMORY=1000)
+    def test_too_large_upload_rejected(self):
+        """Картинку сверх бюджета памяти форма отклоняет."""
+        buffer = BytesIO()
+        Image.new('RGB', (100, 100)).save(buffer, 'PNG')
+        response = self.authorized_client.post(CREATE_URL, data={
+            'text': 'Бомба',
+            'image': SimpleUploadedFile(
+                'bomb.png', buffer.getvalue(), content_type='image/png'),
+        })
+        self.assertFalse(Post.objects.filter(text='Бомба').exists())
+        self.assertFormError(response, 'form', 'image', IMAGE_TOO_LARGE)
+
     def test_edit_post(self):
         """Валидная форма редактирует запись в Post."""
         form_data = {
@@ -0,0 +1,65 @@
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.fragments import get_metrics
+
+from ..cards import METRICS_NAME, render_cards
+from ..models import Follow, Group, Post, User
+
+JINJA2_FEEDS = dict.fromkeys(settings.FEED_TEMPLATE_ENGINES, 'jinja2')
+
+
+def normalize(html):
+    return re.sub(r'\s+', ' ', html).strip()
+
+
+class Jinja2FeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='leo', first_name='Лев', last_name='Толстой')
+        cls.author = User.objects.create_user(username='anna')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Первая\n<b>вторая</b>')
+        Post.objects.bulk_create(
+            Post(
+                text=f'Пост {i}\n<i>курсив</i>',
+                author=cls.author if i % 2 else cls.user,
+                group=cls.group if i % 3 else None)
+            for i in range(settings.FIRST_OF_POSTS + 3))
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def render(self, url):
+        cache.clear()
+        return normalize(self.client.get(url).content.decode())
+
+    def test_feeds_match_django_templates(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:group_list', args=['group']),
+            reverse('posts:profile', args=['anna']),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                django = self.render(url)
+                with override_settings(FEED_TEMPLATE_ENGINES=JINJA2_FEEDS):
+                    self.assertEqual(self.render(url), django)
+
+    def test_engines_keep_separate_cards(self):
+        cache.clear()
+        posts = Post.objects.for_feed()[:3]
+        render_cards(posts)
+        cards = render_cards(posts, using='jinja2')
+        self.assertEqual(get_metrics(METRICS_NAME)['misses'], 6)
+        self.assertIn('Комментариев: 0', cards[0])
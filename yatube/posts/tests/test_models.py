@@ -1,7 +1,13 @@
-from django.test import TestCase
+import os
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.conf import settings
 
-from ..models import Group, Post, User, Comment, Follow
+from ..models import (
+    Group, Post, User, Comment, Follow, UserStats, UserStatsManager)
+from ..page_cache import VERSION_KEY, dependency, get_versions
 
 TEXT_POST = (
     'Автор поста {author} группы {group} '
@@ -74,3 +80,62 @@ class PostModelTest(TestCase):
                 user=self.follow.user.username,
                 author=self.follow.author.username),
             str(self.follow))
+
+    def test_rebuild_user_stats(self):
+        """Команда восстанавливает статистику с нуля."""
+        UserStats.objects.all().delete()
+        call_command('rebuild_user_stats', stdout=open(os.devnull, 'w'))
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(
+            (stats.posts_count, stats.follows_count,
+             stats.followers_count, stats.comments_count),
+            (1, 0, 1, 1))
+        self.assertEqual(
+            UserStats.objects.get(user=self.user2).follows_count, 1)
+
+    def test_stats_row_inserted_concurrently(self):
+        """Строка, которую успел вставить соседний запрос, не мешает."""
+        with mock.patch.object(
+                UserStatsManager, 'filter',
+                return_value=UserStats.objects.none()):
+            stats = UserStats.objects.get_or_rebuild(self.user)
+        self.assertEqual(stats.posts_count, 1)
+
+    def test_comments_count(self):
+        """Счетчик следует за комментариями, команда чинит расхождения."""
+        comment = Comment.objects.create(
+            post=self.post, text='Еще один', author=self.user2)
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 2)
+        comment.delete()
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 1)
+        Post.objects.update(comments_count=5)
+        call_command(
+            'reconcile_comment_counts', stdout=open(os.devnull, 'w'))
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 1)
+        self.assertEqual(Post.objects.reconcile_comments(), 0)
+
+    @override_settings(POST_EXCERPT_WORDS=3)
+    def test_text_html(self):
+        """HTML текста считается при сохранении и командой для старых."""
+        post = Post.objects.create(
+            author=self.user, text='<b>Раз</b> два\n\nтри четыре')
+        self.assertEqual(
+            post.text_html,
+            '<p>&lt;b&gt;Раз&lt;/b&gt; два</p>\n\n<p>три четыре</p>')
+        self.assertEqual(
+            post.excerpt_html, '&lt;b&gt;Раз&lt;/b&gt; два<br><br>три…')
+        Post.objects.update(text_html='', excerpt_html='')
+        key = VERSION_KEY.format(dependency('post', post.pk))
+        version = get_versions([dependency('post', post.pk)])[key]
+        call_command(
+            'render_post_html', batch_size=1, stdout=open(os.devnull, 'w'))
+        # Карточка с прежним HTML устарела
+        self.assertGreater(
+            get_versions([dependency('post', post.pk)])[key], version)
+        post.refresh_from_db()
+        self.assertEqual(
+            post.excerpt_html, '&lt;b&gt;Раз&lt;/b&gt; два<br><br>три…')
+        self.assertFalse(Post.objects.filter(text_html='').exists())
@@ -0,0 +1,246 @@
+import re
+from html import unescape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..counters import count_posts
+from ..models import Comment, Group, Post, User
+from ..paginators import (
+    CommentPaginator, CountingPaginator, CursorPage, CursorPaginator,
+    decode_cursor, encode_cursor, page_window)
+
+USERNAME = 'leo'
+INDEX_URL = reverse('posts:index')
+PROFILE_URL = reverse('posts:profile', args=[USERNAME])
+
+
+def run_commit_hooks():
+    """Колбэки on_commit, которые TestCase сам не выполняет."""
+    callbacks, connection.run_on_commit = connection.run_on_commit, []
+    for _, callback in callbacks:
+        callback()
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=cls.user)
+            for i in range(settings.FIRST_OF_POSTS * 2 + 3)
+        )
+        cls.posts = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_round_trip(self):
+        """Токен однозначно восстанавливает ключ поста."""
+        post = self.posts[0]
+        self.assertEqual(
+            decode_cursor(encode_cursor(post)), (post.pub_date, post.pk))
+
+    def test_broken_cursor(self):
+        for token in ('', '!!!', 'bm90LWEtY3Vyc29y'):
+            with self.subTest(token=token):
+                self.assertIsNone(decode_cursor(token))
+
+    def test_walk_forward_and_back(self):
+        """Проход по ленте вперед и назад токенами отдает все посты."""
+        paginator = CursorPaginator(
+            Post.objects.all(), settings.FIRST_OF_POSTS)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(after=pages[-1].next_cursor))
+        self.assertEqual(
+            [post for page in pages for post in page], self.posts)
+        self.assertEqual(len(pages[-1]), 3)
+        self.assertFalse(pages[0].has_previous())
+        back = paginator.get_page(before=pages[-1].previous_cursor)
+        self.assertEqual(list(back), list(pages[-2]))
+
+    def test_views_accept_cursor(self):
+        first = Client().get(PROFILE_URL).context['page_obj']
+        token = encode_cursor(first[len(first) - 1])
+        for url in (INDEX_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                page_obj = Client().get(
+                    f'{url}?after={token}').context['page_obj']
+                self.assertEqual(
+                    list(page_obj),
+                    self.posts[
+                        settings.FIRST_OF_POSTS:settings.FIRST_OF_POSTS * 2])
+
+    def test_next_link_leads_to_cursor_page(self):
+        """Ссылка «Следующая» нумерованной ленты ведет на keyset-страницу."""
+        html = Client().get(INDEX_URL).content.decode()
+        link = re.search(
+            r'href="(\?[^"]*)">\s*Следующая', html).group(1)
+        page_obj = Client().get(INDEX_URL + unescape(link)).context[
+            'page_obj']
+        self.assertIsInstance(page_obj, CursorPage)
+        self.assertEqual(
+            list(page_obj),
+            self.posts[settings.FIRST_OF_POSTS:settings.FIRST_OF_POSTS * 2])
+
+
+class CountingPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.group2 = Group.objects.create(title='Группа 2', slug='group2')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_follow_signals(self):
+        """Счетчики меняются при создании, переносе и удалении поста."""
+        self.assertEqual(count_posts('group_id', [self.group.pk]), 0)
+        self.assertEqual(count_posts('group_id', [self.group2.pk]), 0)
+        self.assertEqual(count_posts(), 0)
+        post = Post.objects.create(
+            text='Текст', author=self.user, group=self.group)
+        Post.objects.create(text='Текст', author=self.user)
+        run_commit_hooks()
+        with self.assertNumQueries(0):
+            self.assertEqual(count_posts(), 2)
+            self.assertEqual(count_posts('group_id', [self.group.pk]), 1)
+        self.assertEqual(count_posts('author_id', [self.user.pk]), 2)
+        post.group = self.group2
+        post.save()
+        run_commit_hooks()
+        with self.assertNumQueries(0):
+            self.assertEqual(count_posts('group_id', [self.group.pk]), 0)
+            self.assertEqual(count_posts('group_id', [self.group2.pk]), 1)
+        post.delete()
+        run_commit_hooks()
+        with self.assertNumQueries(0):
+            self.assertEqual(count_posts(), 1)
+            self.assertEqual(count_posts('author_id', [self.user.pk]), 1)
+
+    def test_rolled_back_post_keeps_counters(self):
+        self.assertEqual(count_posts(), 0)
+        with self.assertRaises(ValueError), transaction.atomic():
+            Post.objects.create(text='Текст', author=self.user)
+            raise ValueError
+        run_commit_hooks()
+        self.assertEqual(count_posts(), 0)
+
+    def test_page_window(self):
+        paginator = CountingPaginator(range(1000), 10)
+        for number, window in (
+            (1, [1, 2, 3, 4, None, 100]),
+            (50, [1, None, 47, 48, 49, 50, 51, 52, 53, None, 100]),
+            (5, [1, 2, 3, 4, 5, 6, 7, 8, None, 100]),
+            (100, [1, None, 97, 98, 99, 100]),
+        ):
+            with self.subTest(number=number):
+                self.assertEqual(
+                    page_window(paginator.page(number), 3), window)
+        self.assertEqual(
+            page_window(CountingPaginator(range(30), 10).page(2), 3),
+            [1, 2, 3])
+        self.assertEqual(
+            page_window(paginator.page(8), 3, last=10),
+            [1, None, 5, 6, 7, 8, 9, 10, None])
+
+    @override_settings(FEED_NUMBERED_PAGES=12)
+    def test_paginator_renders_window(self):
+        Post.objects.bulk_create(
+            Post(text='Текст', author=self.user)
+            for _ in range(settings.FIRST_OF_POSTS * 20))
+        response = Client().get(INDEX_URL, {'page': 10})
+        self.assertEqual(
+            response.context['page_obj'].page_window,
+            [1, None, 7, 8, 9, 10, 11, 12, None])
+        # Глубже FEED_NUMBERED_PAGES номеров нет, конец — по ключу
+        self.assertContains(response, '?page=last')
+        self.assertNotContains(response, '?page=13"')
+        self.assertNotContains(response, '?page=20"')
+        response = Client().get(INDEX_URL, {'page': 20})
+        self.assertEqual(response.context['page_obj'].number, 12)
+        for number in (0, -3):
+            with self.subTest(number=number):
+                response = Client().get(INDEX_URL, {'page': number})
+                self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_last_page_by_key(self):
+        """«Последняя» — самые старые посты, выбранные без OFFSET."""
+        Post.objects.bulk_create(
+            Post(text='Текст', author=self.user)
+            for _ in range(settings.FIRST_OF_POSTS * 2 + 3))
+        posts = list(Post.objects.order_by('-pub_date', '-pk'))
+        page_obj = Client().get(INDEX_URL, {'page': 'last'}).context[
+            'page_obj']
+        self.assertIsInstance(page_obj, CursorPage)
+        self.assertEqual(list(page_obj), posts[-settings.FIRST_OF_POSTS:])
+        self.assertFalse(page_obj.has_next())
+        back = Client().get(
+            INDEX_URL, {'before': page_obj.previous_cursor}).context[
+            'page_obj']
+        self.assertEqual(
+            list(back), posts[
+                -settings.FIRST_OF_POSTS * 2:-settings.FIRST_OF_POSTS])
+
+    def test_paginator_uses_counter(self):
+        Post.objects.create(text='Текст', author=self.user)
+        count_posts()
+        paginator = CountingPaginator(
+            Post.objects.all(), settings.FIRST_OF_POSTS, counter=count_posts)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, 1)
+            self.assertEqual(list(paginator.page_range), [1])
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(text='Текст', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(7))
+        cls.comments = list(cls.post.comments.order_by('created', 'pk'))
+        cls.detail_url = reverse('posts:post_detail', args=[cls.post.pk])
+        cls.comments_url = reverse('posts:post_comments', args=[cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_walk(self):
+        """Одна выборка на страницу, вместе с числом оставшихся."""
+        paginator = CommentPaginator(self.post.comments.all(), 3)
+        with self.assertNumQueries(1):
+            pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual(
+            [comment for page in pages for comment in page], self.comments)
+        self.assertEqual([page.remaining for page in pages], [7, 4, 1])
+
+    def test_post_detail_shows_first_page(self):
+        response = Client().get(self.detail_url)
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.comments[:3])
+        self.assertContains(response, 'Комментариев к записи: 7')
+        self.assertContains(response, f'?after={comments.next_cursor}')
+
+    def test_comments_endpoint(self):
+        first = Client().get(self.detail_url).context['comments']
+        data = Client().get(
+            self.comments_url, {'after': first.next_cursor}).json()
+        self.assertEqual(data['remaining'], 4)
+        self.assertIn('Комментарий 5', data['html'])
+        self.assertNotIn('Комментарий 2', data['html'])
+        data = Client().get(self.comments_url, {'after': data['next']}).json()
+        self.assertIsNone(data['next'])
+        self.assertIn('Комментарий 6', data['html'])
@@ -0,0 +1,127 @@
+from django.conf import settings
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post, User
+from ..search import SearchResults, deferred_index, highlight
+from ..stemmer import stem
+
+SEARCH_URL = reverse('posts:search')
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        for forms in (
+            ('книга', 'книги', 'книгой', 'книгах'),
+            ('программирование', 'программирования'),
+            ('красивая', 'красивый', 'красивейший'),
+            ('ёлка', 'елки'),
+        ):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({stem(form) for form in forms}), 1)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo')
+        cls.post = Post.objects.create(
+            text='Лучшие книги о программировании', author=cls.user)
+        cls.commented = Post.objects.create(
+            text='Фотографии с прогулки', author=cls.user)
+        Comment.objects.create(
+            post=cls.commented, author=cls.user, text='Прочитал книгу')
+        Post.objects.create(text='Совсем о другом', author=cls.user)
+
+    def search(self, query, **params):
+        return Client().get(SEARCH_URL, {'q': query, **params})
+
+    def test_finds_word_forms_in_posts_and_comments(self):
+        """Другая форма слова находит и пост, и пост по комментарию."""
+        page_obj = self.search('книгой').context['page_obj']
+        self.assertEqual(list(page_obj), [self.post, self.commented])
+        self.assertEqual(page_obj.paginator.count, 2)
+
+    def test_snippet_highlights_matches(self):
+        post = self.search('книга').context['page_obj'][0]
+        self.assertIn('<mark>книги</mark>', post.snippet)
+        self.assertEqual(
+            highlight('<b>книга</b>', {stem('книга')}),
+            '&lt;b&gt;<mark>книга</mark>&lt;/b&gt;')
+
+    def test_index_follows_changes(self):
+        """Индекс следует за save(), массовой загрузкой и удалением."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Про котов'
+        post.save()
+        with deferred_index():
+            Post.objects.bulk_create([
+                Post(text='Книга рецептов', author=self.user)])
+        self.commented.delete()
+        self.assertEqual(
+            [post.text for post in self.search('книги').context['page_obj']],
+            ['Книга рецептов'])
+        self.assertEqual(
+            list(self.search('кот').context['page_obj']), [self.post])
+
+    def test_schema_has_no_python_functions(self):
+        """Писать в посты могут и соединения без функций Django."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND sql LIKE '%search_stem%'")
+            self.assertEqual(cursor.fetchall(), [])
+
+    def test_pagination(self):
+        with deferred_index():
+            Post.objects.bulk_create(
+                Post(text=f'Книга номер {i}', author=self.user)
+                for i in range(settings.FIRST_OF_POSTS))
+        response = self.search('книга', page=2)
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertContains(
+            response, '?q=%D0%BA%D0%BD%D0%B8%D0%B3%D0%B0&amp;page=1')
+
+    @override_settings(SEARCH_RANK_LIMIT=1)
+    def test_rank_limit(self):
+        """Ранжируются только новейшие совпадения, остальные — по дате."""
+        commented = Post.objects.create(text='Без слова', author=self.user)
+        Comment.objects.create(
+            post=commented, author=self.user, text='Про книгу')
+        with deferred_index():
+            Post.objects.bulk_create(
+                Post(text=f'Книга номер {i}', author=self.user)
+                for i in range(3))
+        newest = Post.objects.latest('pk')
+        results = SearchResults('книга', Post.objects.all())
+        found = [post.pk for post in results[0:1] + results[1:10]]
+        self.assertEqual(len(found), results.count())
+        self.assertEqual(set(found[:2]), {newest.pk, commented.pk})
+        self.assertEqual(found[2:], sorted(found[2:], reverse=True))
+
+    @override_settings(SEARCH_COUNT_LIMIT=1)
+    def test_count_limit(self):
+        """Счет останавливается на лимите, страницы — тоже."""
+        response = self.search('книга')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 1)
+        self.assertEqual(page_obj.paginator.num_pages, 1)
+        self.assertContains(response, 'Найдено: больше 1')
+        self.assertContains(self.search('прогулка'), 'Найдено: 1<')
+
+    def test_query_syntax_is_not_interpreted(self):
+        for query in ('"', 'книга OR', '* NEAR(', '', '   '):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query).status_code, 200)
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'книгу'})
+        self.assertEqual(
+            set(response.context['cl'].result_list),
+            {self.post, self.commented})
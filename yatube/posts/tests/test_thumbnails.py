@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
+
+from ..models import Post, ThumbnailJob, User
+from ..thumbnails import QueuedThumbnailBackend, process_jobs
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=2)
+class ThumbnailQueueTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='thumb.gif', content=SMALL_GIF, content_type='image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_saving_image_queues_all_sizes(self):
+        for geometry, options in settings.POST_THUMBNAILS:
+            with self.subTest(geometry=geometry):
+                self.assertTrue(ThumbnailJob.objects.filter(
+                    name=self.post.image.name, geometry=geometry).exists())
+
+    @override_settings(THUMBNAIL_WORKERS=1)
+    def test_worker_processes_queue(self):
+        geometry, options = settings.POST_THUMBNAILS[1]
+        call_command(
+            'process_thumbnails', once=True, stdout=open(os.devnull, 'w'))
+        self.assertFalse(ThumbnailJob.objects.exists())
+        thumbnail = get_thumbnail(self.post.image, geometry, **options)
+        self.assertEqual(tuple(thumbnail.size), (960, 500))
+
+    def test_original_until_warmed(self):
+        """До генерации тег получает оригинал, после — миниатюру."""
+        geometry, options = settings.POST_THUMBNAILS[0]
+        self.assertEqual(
+            get_thumbnail(self.post.image, geometry, **options).name,
+            self.post.image.name)
+        call_command('warm_thumbnails', stdout=open(os.devnull, 'w'))
+        thumbnail = get_thumbnail(self.post.image, geometry, **options)
+        self.assertNotEqual(thumbnail.name, self.post.image.name)
+        self.assertEqual(tuple(thumbnail.size), (960, 350))
+
+    def test_render_miss_queues_once(self):
+        """Повторные просмотры без миниатюры не пишут в базу."""
+        ThumbnailJob.objects.all().delete()
+        geometry, options = settings.POST_THUMBNAILS[0]
+        get_thumbnail(self.post.image, geometry, **options)
+        self.assertEqual(ThumbnailJob.objects.count(), 1)
+        ThumbnailJob.objects.all().delete()
+        get_thumbnail(self.post.image, geometry, **options)
+        self.assertFalse(ThumbnailJob.objects.exists())
+
+    @override_settings(THUMBNAIL_WORKERS=1, THUMBNAIL_CLAIM_TIMEOUT=0)
+    def test_failed_job_stays_queued(self):
+        """Задача удаляется только после успешной генерации."""
+        with mock.patch.object(
+                QueuedThumbnailBackend, 'generate', side_effect=OSError), \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            self.assertEqual(process_jobs(10), 2)
+        self.assertEqual(ThumbnailJob.objects.filter(
+            claimed_at__isnull=False).count(), 2)
+        self.assertEqual(process_jobs(10), 2)
+        self.assertFalse(ThumbnailJob.objects.exists())
+
+    @override_settings(THUMBNAIL_WORKERS=1)
+    def test_finished_job_changes_etag(self):
+        """Страницы с оригиналом вместо миниатюры получают новый ETag."""
+        client = Client()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+        etags = {url: client.get(url)['ETag'] for url in urls}
+        process_jobs(10)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(client.get(
+                    url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -0,0 +1,130 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry, User, UserStats
+from ..paginators import CursorPage
+
+FOLLOW_INDEX_URL = reverse('posts:follow_index')
+
+
+@override_settings(TIMELINE_ENABLED=True)
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='leo')
+        cls.old_post = Post.objects.create(
+            text='Старый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        return list(self.client.get(FOLLOW_INDEX_URL).context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_cleans(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed(), [self.old_post])
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.feed(), [])
+
+    def test_new_post_fans_out(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_heavy_author_merged_on_read(self):
+        """Посты популярного автора не раскладываются, но видны в ленте."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    def test_walk_merges_heavy_author(self):
+        """Ссылки «Следующая» проходят ленту вместе с популярным автором."""
+        heavy = User.objects.create_user(username='heavy')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=heavy)
+        # Пост, разложенный до того, как автор стал популярным
+        Post.objects.create(text='Ранний', author=heavy)
+        UserStats.objects.get_or_rebuild(heavy)
+        UserStats.objects.filter(user=heavy).update(
+            followers_count=settings.TIMELINE_FANOUT_LIMIT + 1, heavy=True)
+        for i in range(settings.FIRST_OF_POSTS):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            Post.objects.create(text=f'Популярный {i}', author=heavy)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.reader, post__author=heavy).count(), 1)
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        page_obj = self.client.get(FOLLOW_INDEX_URL).context['page_obj']
+        self.assertEqual(page_obj.paginator.count, len(expected))
+        posts = list(page_obj)
+        while page_obj.has_next():
+            page_obj = self.client.get(
+                FOLLOW_INDEX_URL,
+                {'after': page_obj.next_cursor}).context['page_obj']
+            self.assertIsInstance(page_obj, CursorPage)
+            posts += page_obj
+        self.assertEqual(posts, expected)
+        back = self.client.get(
+            FOLLOW_INDEX_URL,
+            {'before': page_obj.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), expected[
+            -len(page_obj) - settings.FIRST_OF_POSTS:-len(page_obj)])
+
+    @override_settings(TIMELINE_BACKFILL=2)
+    def test_count_matches_backfilled_rows(self):
+        """Страниц столько, сколько строк в ленте, а не постов автора."""
+        Post.objects.bulk_create(
+            Post(text='Текст', author=self.author)
+            for _ in range(settings.FIRST_OF_POSTS * 2))
+        Follow.objects.create(user=self.reader, author=self.author)
+        page_obj = self.client.get(FOLLOW_INDEX_URL).context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 2)
+        self.assertEqual(len(page_obj), 2)
+        self.assertFalse(page_obj.has_next())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, TIMELINE_SETTLE_MARGIN=1)
+    def test_unfollow_does_not_settle_heavy_author(self):
+        """Отписка не раскладывает посты, это делает settle_timelines."""
+        others = [
+            User.objects.create_user(username=f'reader{i}') for i in (1, 2)]
+        for user in (self.reader, *others):
+            Follow.objects.create(user=user, author=self.author)
+        self.assertTrue(UserStats.objects.get(user=self.author).heavy)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        for user in others:
+            Follow.objects.filter(user=user, author=self.author).delete()
+        # Подписчиков уже не больше порога, но автор все еще популярен
+        self.assertTrue(UserStats.objects.get(user=self.author).heavy)
+        self.assertFalse(TimelineEntry.objects.filter(post=post))
+        self.assertEqual(self.feed(), [post, self.old_post])
+        call_command('settle_timelines', stdout=StringIO())
+        self.assertFalse(UserStats.objects.get(user=self.author).heavy)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.reader).count(), 2)
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_post_kept_when_author_stops_being_heavy(self):
+        """Пост популярного автора остается в ленте после отписки."""
+        others = [
+            User.objects.create_user(username=f'reader{i}') for i in (1, 2)]
+        for user in (self.reader, *others):
+            Follow.objects.create(user=user, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post))
+        Follow.objects.filter(user=others[0], author=self.author).delete()
+        self.assertEqual(self.feed(), [post, self.old_post])
@@ -0,0 +1,88 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import (
+    Comment, Follow, Group, Post, TimelineEntry, User, UserStats)
+from ..transfer import Importer
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo')
+        cls.author = User.objects.create_user(username='tolstoy')
+        cls.group = Group.objects.create(
+            title='Классика', slug='classic', description='Книги')
+        cls.post = Post.objects.create(
+            text='Война и мир', author=cls.author, group=cls.group)
+        Post.objects.create(text='Анна Каренина', author=cls.author)
+        Comment.objects.create(post=cls.post, author=cls.user, text='Длинно')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def round_trip(self, suffix):
+        """Выгружает базу, очищает ее и загружает выгрузку обратно."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'dump{suffix}')
+            call_command('export_posts', path, stderr=io.StringIO())
+            before = list(
+                Post.objects.order_by('pk').values_list('text', 'pub_date'))
+            User.objects.all().delete()
+            Group.objects.all().delete()
+            call_command(
+                'import_posts', path, batch_size=1, stdout=io.StringIO())
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'pub_date')),
+            before)
+
+    def test_round_trip(self):
+        for suffix in ('.jsonl', '.csv'):
+            with self.subTest(suffix=suffix):
+                self.round_trip(suffix)
+                post = Post.objects.get(text='Война и мир')
+                self.assertEqual(post.group.title, 'Классика')
+                self.assertEqual(post.comments_count, 1)
+                self.assertEqual(post.comments.get().author.username, 'leo')
+                stats = UserStats.objects.get(user__username='tolstoy')
+                self.assertEqual(
+                    (stats.posts_count, stats.followers_count), (2, 1))
+                self.assertTrue(Follow.objects.filter(
+                    user__username='leo',
+                    author__username='tolstoy').exists())
+
+    def test_imported_posts_are_searchable(self):
+        self.round_trip('.jsonl')
+        response = Client().get(reverse('posts:search'), {'q': 'длинный'})
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Война и мир'])
+        Post.objects.create(
+            text='Длинная история', author=User.objects.get(username='leo'))
+        response = Client().get(reverse('posts:search'), {'q': 'длинный'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+
+    @override_settings(TIMELINE_ENABLED=True)
+    def test_import_spreads_only_new_rows(self):
+        """Загрузка раскладывает свои посты и подписки без rebuild."""
+        records = [
+            {'type': 'post', 'id': 1, 'author': 'tolstoy',
+             'text': 'Воскресение'},
+            {'type': 'follow', 'user': 'chekhov', 'author': 'tolstoy'},
+        ]
+        with mock.patch('posts.timeline.rebuild') as rebuild:
+            Importer(batch_size=1).load(records)
+        rebuild.assert_not_called()
+        post = Post.objects.get(text='Воскресение')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user__username='chekhov').count(),
+            Post.objects.filter(author=self.author).count())
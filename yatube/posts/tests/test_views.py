@@ -1,10 +1,16 @@
+import time
+from unittest import mock
+
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.conf import settings
 
-from ..models import Group, Post, User, Follow
+from ..models import Comment, Group, Post, User, Follow
+from ..page_cache import LOCK_KEY, page_key
 
 USERNAME = 'leo'
 USERNAME2 = 'auth2'
@@ -78,6 +84,19 @@ class ViewsTest(TestCase):
         self.assertEqual(self.authorized_client.get(
             PROFILE_URL).context.get('author'), self.user)
 
+    def test_profile_stats(self):
+        """Шапка профиля берет счетчики из одной строки статистики."""
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        Follow.objects.create(user=self.user, author=self.user2)
+        stats = self.guest_client.get(PROFILE_URL).context['stats']
+        self.assertEqual(
+            (stats.posts_count, stats.follows_count,
+             stats.followers_count, stats.comments_count),
+            (1, 1, 1, 1))
+        self.post.delete()
+        stats = self.guest_client.get(PROFILE_URL).context['stats']
+        self.assertEqual((stats.posts_count, stats.comments_count), (0, 0))
+
     def test_group_list_page_show_correct_context(self):
         """Шаблон group_list сформирован с правильным контекстом."""
         group = self.authorized_client.get(GROUP_LIST_URL).context.get('group')
@@ -142,6 +161,33 @@ class ViewsTest(TestCase):
                 self.assertEqual(len(self.author2.get(
                     url).context['page_obj']), count_posts)
 
+    def feed_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.author2.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_grow_with_posts(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        Post.objects.update(image='')
+        Post.objects.bulk_create(Post(
+            text=f'Тестовый текст {i}',
+            group=self.group,
+            author=self.user)
+            for i in range(settings.FIRST_OF_POSTS)
+        )
+        PAGES = (
+            (INDEX_URL, INDEX_PAGE_2_URL),
+            (GROUP_LIST_URL, GROUP_LIST_PAGE_2_URL),
+            (PROFILE_URL, PROFILE_PAGE_2_URL),
+            (FOLLOW_INDEX_URL, FOLLOW_INDEX_PAGE_2_URL),
+        )
+        for full_page, last_page in PAGES:
+            with self.subTest(url=full_page):
+                self.assertEqual(
+                    self.feed_queries(full_page),
+                    self.feed_queries(last_page))
+
     def test_cache(self):
         """Проверка работы кеша для главной страницы."""
         page_content = self.authorized_client.get(INDEX_URL).content
@@ -177,3 +223,161 @@ class ViewsTest(TestCase):
         follow_obj_after = Follow.objects.count()
         self.assertEqual(follow_obj_before - 1, follow_obj_after)
         self.assertFalse(subscription)
+
+    def test_follow_is_idempotent(self):
+        """Повторная подписка не создает дубликатов."""
+        for _ in range(2):
+            self.authorized_client.get(PROFILE_FOLLOW_URL)
+        self.assertEqual(Follow.objects.filter(
+            user=self.user, author=self.user2).count(), 1)
+
+    def test_follow_ajax(self):
+        """AJAX-подписка отвечает JSON с числом подписчиков."""
+        for url, following, count in (
+            (PROFILE_FOLLOW_URL, True, 1),
+            (PROFILE_UNFOLLOW_URL, False, 0),
+        ):
+            with self.subTest(url=url):
+                response = self.authorized_client.get(
+                    url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+                self.assertEqual(response.json(), {
+                    'following': following,
+                    'followers_count': count,
+                })
+
+    def test_anonymous_page_cache(self):
+        """Повторный анонимный запрос не ходит в базу, правка сбрасывает."""
+        cache.clear()
+        post_url = reverse('posts:post_detail', args=[self.post.id])
+        for url in (INDEX_URL, GROUP_LIST_URL, PROFILE_URL, post_url):
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    self.guest_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        for url in (INDEX_URL, GROUP_LIST_URL, PROFILE_URL, post_url):
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url), 'Исправленный текст')
+
+    def test_stale_page_served_while_locked(self):
+        """Пока один запрос перерисовывает страницу, остальным — копия."""
+        cache.clear()
+        old_content = self.guest_client.get(PROFILE_URL).content
+        Post.objects.create(author=self.user, text='Свежий пост')
+        request = RequestFactory().get(PROFILE_URL)
+        cache.add(LOCK_KEY.format(page_key(request)), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.guest_client.get(PROFILE_URL).content, old_content)
+        cache.delete(LOCK_KEY.format(page_key(request)))
+        self.assertContains(self.guest_client.get(PROFILE_URL), 'Свежий пост')
+
+    def test_conditional_get(self):
+        """Повторный запрос с валидаторами получает 304 без запросов."""
+        cache.clear()
+        post_url = reverse('posts:post_detail', args=[self.post.id])
+        urls = (INDEX_URL, GROUP_LIST_URL, PROFILE_URL, post_url)
+        etags = {}
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                etags[url] = response['ETag']
+                # Секунда изменения не закончилась: правка в ту же
+                # секунду не должна получить 304 по If-Modified-Since
+                self.assertFalse(response.has_header('Last-Modified'))
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 304)
+        with mock.patch('time.time', return_value=time.time() + 2):
+            for url in urls:
+                with self.subTest(url=url):
+                    response = self.guest_client.get(url)
+                    with self.assertNumQueries(0):
+                        self.assertEqual(self.guest_client.get(
+                            url,
+                            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                        ).status_code, 304)
+        # Комментарий меняет число комментариев в карточках всех лент
+        # с постом, в том числе профиля его автора
+        Comment.objects.create(post=self.post, author=self.user2, text='Да')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 200)
+        self.assertEqual(self.guest_client.get(
+            GROUP_LIST_URL2, HTTP_IF_NONE_MATCH=self.guest_client.get(
+                GROUP_LIST_URL2)['ETag']).status_code, 304)
+
+    def test_renamed_rows_expire_pages(self):
+        """Имя автора и название группы из карточек не залеживаются."""
+        cache.clear()
+        author = User.objects.create_user(username='renamed_author')
+        commenter = User.objects.create_user(username='renamed_commenter')
+        group = Group.objects.create(title='Прежняя', slug='renamed_group')
+        post = Post.objects.create(author=author, text='Пост', group=group)
+        Comment.objects.create(post=post, author=commenter, text='Да')
+        post_url = reverse('posts:post_detail', args=[post.pk])
+        group_url = reverse('posts:group_list', args=[group.slug])
+        profile_url = reverse('posts:profile', args=[author.username])
+        urls = (INDEX_URL, group_url, profile_url, post_url)
+        changes = (
+            (author, 'first_name', 'Лев', (INDEX_URL, group_url, post_url)),
+            (group, 'title', 'Переименованная',
+             (INDEX_URL, profile_url, post_url)),
+            (commenter, 'username', 'new_name', (post_url,)),
+        )
+        for instance, field, value, changed_urls in changes:
+            for url in urls:
+                self.guest_client.get(url)
+            setattr(instance, field, value)
+            instance.save()
+            for url in changed_urls:
+                with self.subTest(field=field, url=url):
+                    self.assertContains(self.guest_client.get(url), value)
+
+    def test_conditional_get_after_rename(self):
+        """Старый ETag не подходит после правки автора или группы."""
+        cache.clear()
+        author = User.objects.create_user(username='etag_author')
+        group = Group.objects.create(title='Прежняя', slug='etag_group')
+        post = Post.objects.create(author=author, text='Пост', group=group)
+        urls = {
+            author: (INDEX_URL, reverse(
+                'posts:group_list', args=[group.slug]), reverse(
+                'posts:post_detail', args=[post.pk])),
+            group: (INDEX_URL, reverse(
+                'posts:profile', args=[author.username]), reverse(
+                'posts:post_detail', args=[post.pk])),
+        }
+        for instance, field in ((author, 'first_name'), (group, 'title')):
+            etags = {
+                url: self.guest_client.get(url)['ETag']
+                for url in urls[instance]}
+            setattr(instance, field, 'Новое имя')
+            instance.save()
+            for url, etag in etags.items():
+                with self.subTest(field=field, url=url):
+                    self.assertEqual(self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_renamed_slug_lookup(self):
+        """Slug, перешедший к другой группе, проверяется по ее версии."""
+        cache.clear()
+        self.guest_client.get(GROUP_LIST_URL2)
+        self.group2.slug = 'renamed'
+        self.group2.save()
+        group = Group.objects.create(title='Новая', slug=SLUG2)
+        etag = self.guest_client.get(GROUP_LIST_URL2)['ETag']
+        Post.objects.create(author=self.user, text='В новой', group=group)
+        self.assertEqual(self.guest_client.get(
+            GROUP_LIST_URL2, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_page_cache_skips_authorized(self):
+        cache.clear()
+        self.guest_client.get(PROFILE_URL)
+        response = self.authorized_client.get(PROFILE_URL)
+        self.assertIsNotNone(response.context)
+        self.assertFalse(response.has_header('ETag'))
@@ -0,0 +1,144 @@
+"""Фоновая генерация миниатюр sorl-thumbnail.
+
+QueuedThumbnailBackend подключается через THUMBNAIL_BACKEND: если
+миниатюры еще нет в хранилище ключей sorl, тег {% thumbnail %} получает
+оригинал картинки, а задача записывается в таблицу ThumbnailJob.
+Новые картинки постов ставятся в очередь сразу после сохранения.
+Очередь разбирает `manage.py process_thumbnails` пулом из
+THUMBNAIL_WORKERS потоков; при THUMBNAIL_WORKERS = 0 (по умолчанию)
+миниатюры генерируются сразу при отрисовке, как в обычном sorl.
+
+Воркер помечает задачу claimed_at и удаляет ее только после успешной
+генерации; задача упавшего воркера через THUMBNAIL_CLAIM_TIMEOUT
+достается следующему.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post, ThumbnailJob
+from .page_cache import bump_feeds, dependency
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedThumbnailBackend(ThumbnailBackend):
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not settings.THUMBNAIL_WORKERS:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        cached = self.get_cached(file_, geometry_string, options)
+        if cached:
+            return cached
+        # Отрисовка пишет в очередь одну задачу на миниатюру за
+        # THUMBNAIL_CLAIM_TIMEOUT, а не INSERT на каждый просмотр
+        name = getattr(file_, 'name', file_)
+        if cache.add(
+                f'thumbnail-job:{name}:{geometry_string}', True,
+                settings.THUMBNAIL_CLAIM_TIMEOUT):
+            enqueue(file_, geometry_string, options)
+        return ImageFile(file_)
+
+    def get_cached(self, file_, geometry_string, options):
+        """Готовая миниатюра из хранилища ключей или None."""
+        source = ImageFile(file_)
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+    def generate(self, file_, geometry_string, **options):
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+
+def enqueue(file_, geometry_string, options):
+    ThumbnailJob.objects.bulk_create([ThumbnailJob(
+        name=getattr(file_, 'name', file_),
+        geometry=geometry_string,
+        options=json.dumps(options),
+    )], ignore_conflicts=True)
+
+
+def enqueue_post(post):
+    if not settings.THUMBNAIL_WORKERS:
+        return
+    for geometry_string, options in settings.POST_THUMBNAILS:
+        enqueue(post.image.name, geometry_string, options)
+
+
+def warm_post(post):
+    for geometry_string, options in settings.POST_THUMBNAILS:
+        default.backend.generate(post.image.name, geometry_string, **options)
+
+
+def run_job(job):
+    try:
+        default.backend.generate(
+            job.name, job.geometry, **json.loads(job.options))
+    except Exception:
+        # Задача остается помеченной и повторится после таймаута
+        logger.exception('Thumbnail %s for %s failed', job.geometry, job.name)
+        return
+    job.delete()
+    # Страницы и карточки с оригиналом вместо миниатюры устарели
+    posts = Post.objects.filter(image=job.name)
+    bump_feeds(posts, *(
+        dependency('post', pk) for pk in posts.values_list('pk', flat=True)))
+
+
+def run_job_in_thread(job):
+    try:
+        run_job(job)
+    finally:
+        close_old_connections()
+
+
+def claim_jobs(batch_size):
+    """Помечает до batch_size свободных задач и возвращает их.
+
+    Задачу забирает тот, чей UPDATE со старым claimed_at изменил строку,
+    поэтому несколько воркеров не генерируют одну миниатюру дважды.
+    """
+    now = timezone.now()
+    free = Q(claimed_at__isnull=True) | Q(
+        claimed_at__lt=now - timedelta(
+            seconds=settings.THUMBNAIL_CLAIM_TIMEOUT))
+    jobs = []
+    for job in ThumbnailJob.objects.filter(free)[:batch_size]:
+        if ThumbnailJob.objects.filter(
+                pk=job.pk, claimed_at=job.claimed_at).update(claimed_at=now):
+            job.claimed_at = now
+            jobs.append(job)
+    return jobs
+
+
+def process_jobs(batch_size):
+    """Разбирает до batch_size задач, возвращает число обработанных."""
+    jobs = claim_jobs(batch_size)
+    if settings.THUMBNAIL_WORKERS > 1:
+        with ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails') as executor:
+            list(executor.map(run_job_in_thread, jobs))
+    else:
+        for job in jobs:
+            run_job(job)
+    return len(jobs)
@@ -0,0 +1,174 @@
+"""Лента подписок с раскладкой при записи (fan-out-on-write).
+
+Новый пост сразу раскладывается в TimelineEntry всех подписчиков
+автора, и лента подписок читается диапазоном по индексу
+(user, -pub_date, -post). Посты популярных авторов (UserStats.heavy)
+не раскладываются и подмешиваются при чтении. Популярным автор
+становится, как только подписчиков больше TIMELINE_FANOUT_LIMIT,
+а перестает только в `manage.py settle_timelines`, когда их не больше
+TIMELINE_FANOUT_LIMIT - TIMELINE_SETTLE_MARGIN: раскладка его постов
+всем подписчикам не делается в запросе отписки, а зазор не дает
+автору на границе переключаться туда и обратно.
+"""
+from django.conf import settings
+
+from .counters import count_posts
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginators import CursorPaginator
+
+
+def is_heavy(author_id, using='default'):
+    return UserStats.objects.using(using).filter(
+        user_id=author_id, heavy=True).exists()
+
+
+def promote(author_id, using='default'):
+    UserStats.objects.using(using).filter(
+        user_id=author_id, heavy=False,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(heavy=True)
+
+
+def settled_authors(using='default'):
+    return UserStats.objects.using(using).filter(
+        heavy=True,
+        followers_count__lte=(
+            settings.TIMELINE_FANOUT_LIMIT - settings.TIMELINE_SETTLE_MARGIN))
+
+
+def fan_out(post, using='default'):
+    if not settings.TIMELINE_ENABLED or is_heavy(post.author_id, using):
+        return
+    TimelineEntry.objects.using(using).bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in Follow.objects.using(using).filter(
+            author_id=post.author_id).values_list('user_id', flat=True)),
+        batch_size=settings.TIMELINE_BATCH_SIZE)
+
+
+def backfill(user_id, author_id, using='default'):
+    if not settings.TIMELINE_ENABLED or is_heavy(author_id, using):
+        return
+    TimelineEntry.objects.using(using).bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in Post.objects.using(using)
+         .filter(author_id=author_id)
+         .values_list('pk', 'pub_date')[:settings.TIMELINE_BACKFILL]),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True)
+
+
+def settle(author_id, using='default'):
+    """Раскладывает посты автора, который перестал быть популярным.
+
+    Флаг снимается до раскладки: новые подписки и посты с этого
+    момента раскладываются сами, конфликты с ними пропускаются.
+    Возвращает False, если автор все еще популярен.
+    """
+    if not settled_authors(using).filter(
+            user_id=author_id).update(heavy=False):
+        return False
+    posts = list(Post.objects.using(using).filter(
+        author_id=author_id).values_list(
+        'pk', 'pub_date')[:settings.TIMELINE_BACKFILL])
+    TimelineEntry.objects.using(using).bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for user_id in Follow.objects.using(using).filter(
+            author_id=author_id).values_list('user_id', flat=True).iterator()
+         for pk, pub_date in posts),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True)
+    return True
+
+
+def settle_all(using='default'):
+    """Раскладывает посты всех переставших быть популярными авторов."""
+    if not settings.TIMELINE_ENABLED:
+        return 0
+    return sum(
+        settle(author_id, using) for author_id in
+        list(settled_authors(using).values_list('user_id', flat=True)))
+
+
+def drop(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+class Timeline:
+    """Лента подписок для пагинаторов, как SearchResults.
+
+    Ключи (post_id, pub_date) берутся диапазоном по индексу
+    (user, -pub_date, -post) самой ленты, посты популярных авторов
+    добавляются UNION; сами посты затем загружаются по id.
+    """
+    def __init__(self, user, posts):
+        self.user = user
+        self.posts = posts
+        self.heavy = list(Follow.objects.filter(
+            user=user,
+            author__stats__heavy=True,
+        ).values_list('author_id', flat=True))
+
+    def keys(self, key=None, ascending=False):
+        entries = TimelineEntry.objects.filter(user=self.user)
+        posts = Post.objects.filter(author_id__in=self.heavy)
+        if key is not None:
+            pub_date, pk = key
+            if ascending:
+                entries = entries.filter(pub_date__gte=pub_date).exclude(
+                    pub_date=pub_date, post__lte=pk)
+                posts = posts.filter(pub_date__gte=pub_date).exclude(
+                    pub_date=pub_date, pk__lte=pk)
+            else:
+                entries = entries.filter(pub_date__lte=pub_date).exclude(
+                    pub_date=pub_date, post__gte=pk)
+                posts = posts.filter(pub_date__lte=pub_date).exclude(
+                    pub_date=pub_date, pk__gte=pk)
+        keys = entries.order_by().values_list('post_id', 'pub_date')
+        if self.heavy:
+            # UNION без ALL: записи, разложенные до того, как автор
+            # стал популярным, не задваивают его посты
+            keys = keys.union(
+                posts.order_by().values_list('pk', 'pub_date'))
+        if ascending:
+            return keys.order_by('pub_date', 'post_id')
+        return keys.order_by('-pub_date', '-post_id')
+
+    def load(self, keys):
+        ids = [pk for pk, _ in keys]
+        posts = self.posts.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def count(self):
+        entries = TimelineEntry.objects.filter(user=self.user)
+        if not self.heavy:
+            return entries.count()
+        return entries.exclude(
+            post__author_id__in=self.heavy).count() + count_posts(
+            'author_id', self.heavy)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        return self.load(self.keys()[index])
+
+    def select(self, key, limit, ascending=False):
+        return self.load(self.keys(key, ascending)[:limit])
+
+
+class TimelinePaginator(CursorPaginator):
+    """Keyset-пагинация ленты подписок по ее собственному индексу."""
+    def select(self, key, limit, ascending=False):
+        return self.object_list.select(key, limit, ascending)
+
+
+def rebuild(using='default'):
+    TimelineEntry.objects.using(using).all().delete()
+    for user_id, author_id in Follow.objects.using(using).values_list(
+            'user_id', 'author_id').iterator():
+        backfill(user_id, author_id, using)
+    settle_all(using)
@@ -0,0 +1,299 @@
+"""Потоковые выгрузка и загрузка групп, постов, комментариев и подписок.
+
+Запись — словарь с полем type (group, post, comment, follow),
+по строке на запись в JSONL или CSV с колонками FIELDS. Пользователи
+и группы указываются username и slug, пост комментария — id поста
+в том же файле.
+
+Загрузка идет пачками через bulk_create, каждая пачка в своей
+транзакции. Новые id — исходный id плюс максимальный id в базе
+до загрузки, поэтому для связи комментариев с постами не нужно
+держать в памяти таблицу соответствия. Сигналы при bulk_create
+не срабатывают: новые посты и подписки раскладываются в ленты
+подписок после каждой пачки, счетчики, кеш страниц и поисковый индекс
+обновляются один раз в конце. Загружать стоит в базу, в которую
+в это время никто не пишет.
+"""
+import csv
+import json
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, timeline
+from .markup import render_text
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .page_cache import bump, dependency
+from .search import deferred_index
+
+FIELDS = (
+    'type', 'id', 'user', 'author', 'group', 'post', 'title', 'text',
+    'date', 'image',
+)
+TYPES = ('group', 'post', 'comment', 'follow')
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def write_jsonl(stream, records):
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        yield {key: value for key, value in row.items() if value != ''}
+
+
+def write_csv(stream, records):
+    writer = csv.DictWriter(stream, FIELDS)
+    writer.writeheader()
+    writer.writerows(records)
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+WRITERS = {'jsonl': write_jsonl, 'csv': write_csv}
+
+
+def export_records(chunk_size=2000):
+    """Все записи по порядку: группы, посты, комментарии, подписки."""
+    for slug, title, description in (
+            Group.objects.order_by('pk').values_list(
+                'slug', 'title', 'description').iterator(chunk_size)):
+        yield {
+            'type': 'group', 'group': slug, 'title': title,
+            'text': description,
+        }
+    for pk, author, group, text, pub_date, image in (
+            Post.objects.order_by('pk').values_list(
+                'pk', 'author__username', 'group__slug', 'text',
+                'pub_date', 'image').iterator(chunk_size)):
+        record = {
+            'type': 'post', 'id': pk, 'author': author, 'text': text,
+            'date': pub_date.isoformat(),
+        }
+        if group:
+            record['group'] = group
+        if image:
+            record['image'] = image
+        yield record
+    for pk, post, author, text, created in (
+            Comment.objects.exclude(post=None).order_by('pk').values_list(
+                'pk', 'post_id', 'author__username', 'text',
+                'created').iterator(chunk_size)):
+        yield {
+            'type': 'comment', 'id': pk, 'post': post, 'author': author,
+            'text': text, 'date': created.isoformat(),
+        }
+    for user, author in Follow.objects.order_by('pk').values_list(
+            'user__username', 'author__username').iterator(chunk_size):
+        yield {'type': 'follow', 'user': user, 'author': author}
+
+
+@contextmanager
+def keep_dates(*fields):
+    """bulk_create с датами из файла: auto_now_add их перезаписал бы."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Importer:
+    """Копит записи и сбрасывает их в базу пачками по batch_size.
+
+    Пачка пишется целиком, в порядке групп, постов, комментариев
+    и подписок, поэтому комментарий всегда попадает в базу после
+    своего поста, если пост встретился в файле раньше. Размер
+    отдельных INSERT bulk_create выбирает по ограничениям базы.
+    """
+    def __init__(
+            self, batch_size=1000, using='default', rebuild_timeline=False):
+        self.batch_size = batch_size
+        self.using = using
+        self.rebuild_timeline = rebuild_timeline
+        self.users = {}
+        self.groups = {}
+        self.buffers = {kind: [] for kind in TYPES}
+        self.counts = dict.fromkeys(TYPES, 0)
+        self.authors = set()
+        self.touched_groups = set()
+        aggregate = {
+            model: model.objects.using(using).aggregate(last=Max('pk'))
+            for model in (Post, Comment)}
+        self.post_offset = aggregate[Post]['last'] or 0
+        self.comment_offset = aggregate[Comment]['last'] or 0
+
+    def add(self, record):
+        kind = record.get('type')
+        if kind not in self.buffers:
+            raise ValueError(f'Неизвестный тип записи: {kind!r}')
+        if kind in ('post', 'comment') and not record.get('id'):
+            raise ValueError(f'У записи {kind} нет id')
+        self.buffers[kind].append(record)
+        if len(self.buffers[kind]) >= self.batch_size:
+            self.flush()
+
+    def load(self, records):
+        try:
+            with deferred_index(self.using):
+                for record in records:
+                    self.add(record)
+                self.flush()
+        finally:
+            # Уже записанные пачки остаются в базе и при ошибке
+            self.finish()
+        return self.counts
+
+    def flush(self):
+        with transaction.atomic(using=self.using):
+            self.resolve_users()
+            self.resolve_groups()
+            posts = self.insert_posts()
+            self.insert_comments()
+            follows = self.insert_follows()
+            if not self.rebuild_timeline:
+                self.spread(posts, follows)
+        for buffer in self.buffers.values():
+            buffer.clear()
+
+    def resolve_users(self):
+        names = {
+            record[field] for kind in ('post', 'comment', 'follow')
+            for record in self.buffers[kind]
+            for field in ('user', 'author') if record.get(field)
+        } - self.users.keys()
+        if not names:
+            return
+        users = User.objects.using(self.using)
+        missing = names - set(users.filter(
+            username__in=names).values_list('username', flat=True))
+        users.bulk_create(
+            [User(username=name, password='!') for name in missing])
+        self.users.update(users.filter(
+            username__in=names).values_list('username', 'pk'))
+
+    def resolve_groups(self):
+        slugs = {
+            record['group'] for kind in ('group', 'post')
+            for record in self.buffers[kind] if record.get('group')
+        } - self.groups.keys()
+        self.counts['group'] += len(self.buffers['group'])
+        if not slugs:
+            return
+        groups = Group.objects.using(self.using)
+        # Группа без своей записи получает slug вместо заголовка
+        records = {
+            record['group']: record for record in self.buffers['group']}
+        missing = slugs - set(groups.filter(
+            slug__in=slugs).values_list('slug', flat=True))
+        groups.bulk_create([
+            Group(
+                slug=slug,
+                title=records.get(slug, {}).get('title', slug),
+                description=records.get(slug, {}).get('text', ''))
+            for slug in missing])
+        self.groups.update(groups.filter(
+            slug__in=slugs).values_list('slug', 'pk'))
+
+    def insert_posts(self):
+        posts = [
+            Post(
+                pk=self.post_offset + int(record['id']),
+                author_id=self.users[record['author']],
+                group_id=self.groups.get(record.get('group')),
+                text=record.get('text', ''),
+                pub_date=parse_date(record.get('date')),
+                image=record.get('image', ''),
+            ) for record in self.buffers['post']]
+        for post in posts:
+            render_text(post)
+        with keep_dates(Post._meta.get_field('pub_date')):
+            Post.objects.using(self.using).bulk_create(posts)
+        self.authors.update(post.author_id for post in posts)
+        self.touched_groups.update(
+            post.group_id for post in posts if post.group_id)
+        self.counts['post'] += len(posts)
+        return posts
+
+    def insert_comments(self):
+        comments = [
+            Comment(
+                pk=self.comment_offset + int(record['id']),
+                post_id=self.post_offset + int(record['post']),
+                author_id=self.users[record['author']],
+                text=record.get('text', ''),
+                created=parse_date(record.get('date')),
+            ) for record in self.buffers['comment']]
+        with keep_dates(Comment._meta.get_field('created')):
+            Comment.objects.using(self.using).bulk_create(comments)
+        self.authors.update(comment.author_id for comment in comments)
+        self.counts['comment'] += len(comments)
+
+    def insert_follows(self):
+        follows = [
+            Follow(
+                user_id=self.users[record['user']],
+                author_id=self.users[record['author']])
+            for record in self.buffers['follow']
+            if record['user'] != record['author']]
+        Follow.objects.using(self.using).bulk_create(
+            follows, ignore_conflicts=True)
+        self.authors.update(follow.user_id for follow in follows)
+        self.authors.update(follow.author_id for follow in follows)
+        self.counts['follow'] += len(follows)
+        return follows
+
+    def spread(self, posts, follows):
+        """Раскладывает в ленты подписок только записи этой пачки.
+
+        Посты раскладываются всем подписчикам автора, подписки пачки
+        подтягивают его последние посты; совпадения пропускает
+        ignore_conflicts в backfill.
+        """
+        if not settings.TIMELINE_ENABLED:
+            return
+        for post in posts:
+            timeline.fan_out(post, self.using)
+        for follow in follows:
+            timeline.backfill(follow.user_id, follow.author_id, self.using)
+
+    def finish(self):
+        """Обслуживание, отложенное до конца загрузки."""
+        connection = connections[self.using]
+        with connection.cursor() as cursor:
+            for statement in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment]):
+                cursor.execute(statement)
+        Post.objects.using(self.using).filter(
+            pk__gt=self.post_offset).reconcile_comments()
+        UserStats.objects.db_manager(self.using).rebuild(
+            User.objects.using(self.using).filter(pk__in=self.authors))
+        counters.reset_counters()
+        if settings.TIMELINE_ENABLED and self.rebuild_timeline:
+            timeline.rebuild(self.using)
+        bump(
+            dependency('posts'),
+            *(dependency('author', pk) for pk in self.authors),
+            *(dependency('group', pk) for pk in self.touched_groups))
+
+
+def parse_date(value):
+    date = value and parse_datetime(value)
+    if not date:
+        return timezone.now()
+    if timezone.is_naive(date):
+        return timezone.make_aware(date)
+    return date
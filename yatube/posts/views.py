@@ -1,49 +1,179 @@
+from functools import partial
+from urllib.parse import urlencode
+
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
+
+from core import replicas
 
+from .counters import count_posts
+from .page_cache import (
+    cache_anonymous_page, conditional_page, dependency, depends_on, lookup)
 from .forms import PostForm, CommentForm
-from .models import Post, Group, User, Follow
+from .models import Post, Group, User, Follow, UserStats
+from .paginators import (
+    LAST_PAGE, CommentPaginator, CountingPaginator, CursorPaginator,
+    encode_cursor, page_window)
+from .search import SearchResults
+from .timeline import Timeline, TimelinePaginator
+
+
+def page(request, post_list, counter=None,
+         paginator_class=CursorPaginator):
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    last = request.GET.get('page') == LAST_PAGE
+    if after or before or last:
+        return paginator_class(
+            post_list, settings.FIRST_OF_POSTS).get_page(
+            after=after, before=before, last=last)
+    page_obj = numbered_page(request, CountingPaginator(
+        post_list, settings.FIRST_OF_POSTS, counter=counter),
+        settings.FEED_NUMBERED_PAGES)
+    # Соседние и последняя страницы открываются по ключу, без OFFSET
+    # и COUNT(*); по номеру — только первые FEED_NUMBERED_PAGES страниц
+    # из окна пагинатора. Страница бывает пустой, если счетчик отстал
+    # от таблицы.
+    if len(page_obj):
+        if page_obj.has_next():
+            page_obj.next_cursor = encode_cursor(page_obj[-1])
+        if page_obj.has_previous():
+            page_obj.previous_cursor = encode_cursor(page_obj[0])
+    return page_obj
+
+
+def numbered_page(request, paginator, last=None):
+    """Страница по номеру; номера вне 1..last сводятся к границам.
+
+    Иначе Paginator.get_page открыл бы для нуля и отрицательных номеров
+    последнюю страницу через OFFSET.
+    """
+    number = request.GET.get('page')
+    if last is not None:
+        try:
+            number = max(1, min(int(number), last))
+        except (TypeError, ValueError):
+            pass
+    page_obj = paginator.get_page(number)
+    page_obj.page_window = page_window(
+        page_obj, settings.PAGINATOR_ON_EACH_SIDE, last=last)
+    return page_obj
+
+
+def render_feed(request, template_name, context):
+    """render() движком, выбранным для view в FEED_TEMPLATE_ENGINES."""
+    return render(request, template_name, context, using=(
+        settings.FEED_TEMPLATE_ENGINES.get(
+            request.resolver_match.view_name)))
+
+
+def comment_page(post, after=None):
+    return CommentPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE).get_page(after)
+
+
+def feed_dependencies():
+    return [dependency('posts')]
+
+
+def group_dependencies(slug):
+    pk = lookup(f'group:{slug}', lambda: Group.objects.filter(
+        slug=slug).values_list('pk', flat=True).first())
+    return None if pk is None else [dependency('group', pk)]
 
 
-def page(request, post_list):
-    return Paginator(
-        post_list,
-        settings.FIRST_OF_POSTS).get_page(request.GET.get('page'))
+def profile_dependencies(username):
+    pk = lookup(f'author:{username}', lambda: User.objects.filter(
+        username=username).values_list('pk', flat=True).first())
+    return None if pk is None else [dependency('author', pk)]
 
 
+def post_dependencies(post_id):
+    author_id = lookup(f'post:{post_id}', lambda: Post.objects.filter(
+        pk=post_id).values_list('author_id', flat=True).first())
+    if author_id is None:
+        return None
+    return [dependency('post', post_id), dependency('author', author_id)]
+
+
+@conditional_page(feed_dependencies)
+@cache_anonymous_page
 def index(request):
-    return render(request, 'posts/index.html', {
-        'page_obj': page(request, Post.objects.all())
+    return render_feed(request, 'posts/index.html', {
+        'page_obj': page(request, Post.objects.for_feed(), count_posts),
+        'page_version': depends_on(request, dependency('posts')),
     })
 
 
+@conditional_page(group_dependencies)
+@cache_anonymous_page
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    return render(request, 'posts/group_list.html', {
+    depends_on(request, dependency('group', group.pk))
+    return render_feed(request, 'posts/group_list.html', {
         'group': group,
-        'page_obj': page(request, group.posts.all())
+        'page_obj': page(request, group.posts.for_feed(), partial(
+            count_posts, 'group_id', [group.pk]))
     })
 
 
+@conditional_page(profile_dependencies)
+@cache_anonymous_page
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    return render(request, 'posts/profile.html', {
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    depends_on(request, dependency('author', author.pk))
+    try:
+        stats = author.stats
+    except UserStats.DoesNotExist:
+        stats = UserStats.objects.get_or_rebuild(author)
+    return render_feed(request, 'posts/profile.html', {
         'author': author,
-        'page_obj': page(request, author.posts.all()),
+        'stats': stats,
+        'page_obj': page(request, author.posts.for_feed(), partial(
+            count_posts, 'author_id', [author.pk])),
         'following': request.user.is_authenticated and Follow.objects.filter(
-            user=request.user, author=(User.objects.get(username=username))
+            user=request.user, author=author
         ).exists(),
     })
 
 
+@conditional_page(post_dependencies)
+@cache_anonymous_page
 def post_detail(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
+    depends_on(
+        request,
+        dependency('post', post.pk),
+        dependency('author', post.author_id))
     return render(request, 'posts/post_detail.html', {
         'post': post,
         'form': CommentForm(),
-        'comments': post.comments.select_related('author')
+        'comments': comment_page(post, request.GET.get('after')),
+    })
+
+
+@conditional_page(post_dependencies)
+@cache_anonymous_page
+def post_comments(request, post_id):
+    """Следующая порция комментариев после курсора after в JSON."""
+    post = get_object_or_404(Post, pk=post_id)
+    depends_on(
+        request,
+        dependency('post', post.pk),
+        dependency('author', post.author_id))
+    comments = comment_page(post, request.GET.get('after'))
+    return JsonResponse({
+        'html': render_to_string('posts/includes/comment_list.html', {
+            'post': post,
+            'comments': comments,
+        }, request),
+        'next': comments.next_cursor,
+        'remaining': comments.remaining,
     })
 
 
@@ -90,6 +220,7 @@ def post_edit(request, post_id):
 def post_delete(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author == request.user:
+        replicas.stick_to_primary()
         post.delete()
     return redirect('posts:index')
 
@@ -105,32 +236,55 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': numbered_page(request, CountingPaginator(
+            SearchResults(query, Post.objects.for_feed()),
+            settings.FIRST_OF_POSTS)),
+        'page_query': urlencode({'q': query}) + '&',
+    })
+
+
 @login_required
 def follow_index(request):
-    return render(request, 'posts/follow.html', {
-        'page_obj': page(request, (
-            Post.objects.select_related(
-                'author', 'group').filter(
-                author__following__user=request.user)))
+    if settings.TIMELINE_ENABLED:
+        # Число постов — по строкам ленты: backfill кладет в нее
+        # не больше TIMELINE_BACKFILL старых постов автора
+        page_obj = page(
+            request, Timeline(request.user, Post.objects.for_feed()),
+            paginator_class=TimelinePaginator)
+    else:
+        page_obj = page(request, Post.objects.for_feed().filter(
+            author__following__user=request.user), partial(
+            count_posts, 'author_id', Follow.objects.filter(
+                user=request.user).values_list('author_id', flat=True)))
+    return render_feed(request, 'posts/follow.html', {'page_obj': page_obj})
+
+
+def follow_response(request, author, following):
+    if not request.is_ajax():
+        return redirect('posts:profile', username=author.username)
+    stats = UserStats.objects.get_or_rebuild(author)
+    return JsonResponse({
+        'following': following,
+        'followers_count': stats.followers_count,
     })
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if not (author == request.user
-            or Follow.objects.filter(
-                user=request.user, author=author).exists()):
-        Follow.objects.create(user=request.user, author=author)
-    return redirect('posts:profile', username=author)
+    if author != request.user:
+        replicas.stick_to_primary()
+        Follow.objects.get_or_create(user=request.user, author=author)
+    return follow_response(request, author, author != request.user)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author_following = Follow.objects.filter(
-        user=request.user,
-        author=(get_object_or_404(User, username=username))
-    )
-    if author_following.exists():
-        author_following.delete()
-    return redirect('posts:profile', username=username)
+    replicas.stick_to_primary()
+    author = get_object_or_404(User, username=username)
+    Follow.objects.filter(user=request.user, author=author).delete()
+    return follow_response(request, author, False)
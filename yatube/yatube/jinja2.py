@@ -0,0 +1,83 @@
+"""Окружение Jinja2 для лент (шаблоны в каталоге jinja2/).
+
+Заменяет теги и фильтры Django, которые нужны портированным шаблонам:
+url, static, thumbnail, fragment_cache вместо {% fragment_cache %},
+post_cards, а также фильтры date, linebreaksbr и addclass.
+"""
+import logging
+
+from django.template import defaultfilters
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.timezone import template_localtime
+from jinja2 import Environment, Undefined, pass_context
+from markupsafe import Markup
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from core.fragments import get_or_render
+from core.templatetags.user_filters import addclass
+from posts.cards import render_cards
+
+# NAME бэкенда в TEMPLATES
+ENGINE = 'jinja2'
+
+logger = logging.getLogger('sorl.thumbnail')
+
+
+def url(name, *args, **kwargs):
+    return reverse(name, args=args, kwargs=kwargs)
+
+
+def thumbnail(file_, geometry, **options):
+    """Миниатюра или None, как пустой {% thumbnail %}."""
+    if not file_:
+        return None
+    try:
+        return get_thumbnail(file_, geometry, **options)
+    except Exception:
+        if thumbnail_settings.THUMBNAIL_DEBUG:
+            raise
+        logger.exception('Thumbnail failed')
+        return None
+
+
+def fragment_cache(expire_time, name, *vary_on, caller):
+    """{% call fragment_cache(20, 'sidebar', page_obj.number) %}"""
+    return Markup(get_or_render(name, list(vary_on), expire_time, caller))
+
+
+@pass_context
+def post_cards(context, posts):
+    return render_cards(posts, context.get('group'), using=ENGINE)
+
+
+def date(value, arg=None):
+    # Django переводит время в местное до вызова фильтра сам
+    return defaultfilters.date(template_localtime(value), arg)
+
+
+def linebreaksbr(value):
+    # Markup уже экранирован, а SafeData Django о нем не знает
+    return defaultfilters.linebreaksbr(
+        value, autoescape=not hasattr(value, '__html__'))
+
+
+def environment(**options):
+    # Как в шаблонах Django: неизвестная переменная — пустая строка,
+    # а не DebugUndefined, который Django ставит при DEBUG
+    options['undefined'] = Undefined
+    env = Environment(**options)
+    env.globals.update(
+        url=url,
+        static=static,
+        thumbnail=thumbnail,
+        fragment_cache=fragment_cache,
+        post_cards=post_cards,
+    )
+    env.filters.update(
+        date=date,
+        linebreaksbr=linebreaksbr,
+        addclass=addclass,
+    )
+    return env
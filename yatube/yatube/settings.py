@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+from urllib.parse import urlsplit
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -22,7 +23,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 'nid3v=#h%yogr@*(ih*ifo%38*_4$3&mrf0%euw@@fh5x8)82$'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# В продакшене DEBUG=0.
+DEBUG = os.getenv('DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -45,28 +47,42 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Без DEBUG шаблоны компилируются один раз на процесс (cached.Loader),
+# а не при каждом {% include %}. TEMPLATE_CACHE=1/0 переопределяет это,
+# например для замеров benchmarks/template_render.py.
+TEMPLATE_CACHE = os.getenv('TEMPLATE_CACHE', '0' if DEBUG else '1') == '1'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if TEMPLATE_CACHE:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -76,19 +92,76 @@ TEMPLATES = [
             ],
         },
     },
+    # Портированные шаблоны лент, включаются FEED_TEMPLATE_ENGINES
+    {
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'NAME': 'jinja2',
+        'DIRS': [os.path.join(BASE_DIR, 'jinja2')],
+        'OPTIONS': {
+            'environment': 'yatube.jinja2.environment',
+            'auto_reload': not TEMPLATE_CACHE,
+            'context_processors': [
+                'django.contrib.auth.context_processors.auth',
+                'core.context_processors.year.year',
+            ],
+        },
+    },
 ]
+# Загрузчики заданы явно вместо APP_DIRS, шаблоны приложений (и панели
+# debug_toolbar) находит app_directories.Loader.
+SILENCED_SYSTEM_CHECKS = ['debug_toolbar.W006']
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# База задается переменными окружения, по умолчанию — файл SQLite.
+# DB_CONN_MAX_AGE — сколько секунд держать соединение между запросами.
+# DB_POOLER=pgbouncer — соединения идут через PgBouncer в режиме
+# transaction, где серверные курсоры между транзакциями не живут.
+# Драйвер PostgreSQL — psycopg2-binary из requirements.txt; подходит
+# и старое имя бэкенда django.db.backends.postgresql_psycopg2.
+DB_ENGINE = os.getenv('DB_ENGINE', 'django.db.backends.sqlite3')
+if 'postgresql' in DB_ENGINE:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME', 'yatube'),
+            'USER': os.getenv('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_POOLER') == 'pgbouncer',
+        }
     }
-}
+    REPLICA_FIELD = 'HOST'
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv(
+                'DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            # Секунды ожидания блокировки записи, см. core.db
+            'OPTIONS': {'timeout': 20},
+        }
+    }
+    REPLICA_FIELD = 'NAME'
+
+# Реплики только для чтения: DATABASE_REPLICAS — хосты PostgreSQL
+# или файлы SQLite через запятую. GET-запросы читают с них, записи
+# и чтение сразу после записи пользователя (REPLICA_STICKY_SECONDS)
+# идут в default
+REPLICA_DATABASES = []
+for number, replica in enumerate(
+        filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'], REPLICA_FIELD: replica}
+    REPLICA_DATABASES.append(f'replica_{number}')
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 5
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -136,6 +209,32 @@ EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 FIRST_OF_POSTS = 10
+# Сколько слов текста поста показывать в карточке ленты
+POST_EXCERPT_WORDS = 60
+# Сколько номеров страниц показывать по обе стороны от текущей
+PAGINATOR_ON_EACH_SIDE = 3
+# Сколько первых страниц ленты открывается по номеру (OFFSET);
+# дальше только по ключу, в том числе «Последняя»
+FEED_NUMBERED_PAGES = 10
+# Движок шаблонов лент по имени view: 'django' или 'jinja2'
+FEED_TEMPLATE_ENGINES = {
+    'posts:index': 'django',
+    'posts:group_list': 'django',
+    'posts:profile': 'django',
+    'posts:follow_index': 'django',
+}
+# Комментарии под постом, остальные подгружаются порциями
+COMMENTS_PER_PAGE = 20
+POST_COUNT_CACHE_TIMEOUT = 60 * 60
+
+# Лента подписок с раскладкой постов подписчикам при публикации
+TIMELINE_ENABLED = False
+TIMELINE_FANOUT_LIMIT = 1000
+# Раскладка возобновляется, когда подписчиков не больше
+# TIMELINE_FANOUT_LIMIT - TIMELINE_SETTLE_MARGIN (manage.py settle_timelines)
+TIMELINE_SETTLE_MARGIN = 100
+TIMELINE_BACKFILL = 500
+TIMELINE_BATCH_SIZE = 500
 CUT_TEXT = 15
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -143,9 +242,81 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# При THUMBNAIL_WORKERS > 0 миниатюры генерируются в фоне воркером
+# `manage.py process_thumbnails`, до готовности отдается оригинал;
+# при 0 — сразу при отрисовке
+THUMBNAIL_BACKEND = 'posts.thumbnails.QueuedThumbnailBackend'
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 0))
+# Через сколько секунд задачу упавшего воркера берет другой
+THUMBNAIL_CLAIM_TIMEOUT = 300
+POST_THUMBNAILS = (
+    ('960x350', {'crop': 'center', 'upscale': True}),
+    ('960x500', {'crop': 'center', 'upscale': True}),
+)
+
+# Адаптивные варианты картинок постов (srcset)
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POST_IMAGE_QUALITY = 80
+# Загрузки: оригиналы больше стороны уменьшаются, а картинки, чье
+# декодирование займет больше памяти, отклоняются до декодирования
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_MAX_MEMORY = 64 * 1024 * 1024
+
+# Страницы для анонимов, сбрасываются сигналами через версии
+PAGE_CACHE_TIMEOUT = 5 * 60
+# Сколько секунд остальные запросы получают устаревшую копию,
+# пока один перерисовывает страницу
+PAGE_CACHE_LOCK_TIMEOUT = 10
+
+# Карточки постов в лентах, ключ меняется при правке поста
+POST_CARD_CACHE_TIMEOUT = 60 * 60
+
+# {% fragment_cache %}: сколько секунд устаревший фрагмент еще можно
+# отдавать, сколько держится блокировка перерисовки и сколько ждать
+# фрагмент, которого в кеше нет совсем
+FRAGMENT_CACHE_GRACE = 60
+FRAGMENT_CACHE_LOCK_TIMEOUT = 10
+FRAGMENT_CACHE_WAIT = 0.5
+
+# Сколько слов показывать во фрагменте найденного поста
+SEARCH_SNIPPET_WORDS = 30
+# Сколько новейших совпадений поиск сортирует по релевантности;
+# более старые идут за ними по дате
+SEARCH_RANK_LIMIT = 1000
+# До скольких совпадений поиск считает результаты; сверх этого
+# выводится «больше N», а страницы доходят только до лимита
+SEARCH_COUNT_LIMIT = 1000
+
+# Кеш выбирается переменной окружения CACHE_URL:
+#   locmem://                  — в памяти процесса (по умолчанию)
+#   file:///var/tmp/yatube     — файлы, общие для всех воркеров
+#   redis://:pass@host:6379/0  — сервер с протоколом Redis
+CACHE_URL = urlsplit(os.getenv('CACHE_URL', 'locmem://'))
+CACHE_OPTIONS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'file': {
+        # FileBasedCache сам сжимает значения zlib
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_URL.path,
+    },
+    'redis': {
+        'BACKEND': 'core.cache.RedisCache',
+        'LOCATION': f'{CACHE_URL.hostname}:{CACHE_URL.port or 6379}',
+        'OPTIONS': {
+            'DB': CACHE_URL.path.strip('/') or 0,
+            'PASSWORD': CACHE_URL.password,
+            'COMPRESS_MIN_LENGTH': 1024,
+        },
+    },
+}
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        **CACHE_OPTIONS[CACHE_URL.scheme],
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'yatube'),
+        'VERSION': int(os.getenv('CACHE_VERSION', 1)),
     }
 }
 